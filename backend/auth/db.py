@@ -0,0 +1,287 @@
+'''
+Database connection pool for ASUBT backend functions
+Keeps connections open at module scope so warm invocations skip connect cost.
+psycopg2 is imported on first use, so importing this module stays cheap for
+requests that never reach the database.
+Read-only handlers can be routed to streaming replicas (DATABASE_REPLICA_URLS);
+writes always go to the primary. Write responses carry the primary WAL position in
+X-Write-LSN; a client that sends it back is only served by a replica that has
+replayed that far, otherwise the read falls back to the primary.
+Each function directory ships an identical copy of this module.
+'''
+
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from instrumentation import connection_factory, timed
+from responses import get_request_header
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '5'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', '2'))
+REPLICA_RETRY_AFTER = float(os.environ.get('REPLICA_RETRY_AFTER', '30'))
+
+WRITE_LSN_HEADER = 'X-Write-LSN'
+_LSN = re.compile(r'^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$')
+
+# Lag is 0 when the replica has replayed everything it received (an idle primary
+# would otherwise look stale); a server that is not in recovery is always caught up.
+REPLICA_STATUS_SQL = """
+    SELECT CASE
+               WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+               ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END,
+           NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= %s::pg_lsn
+"""
+
+class PoolExhausted(Exception):
+    pass
+
+class ConnectionPool:
+    def __init__(self, dsn: Optional[str], max_size: int, acquire_timeout: float, healthcheck_after: float):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.acquire_timeout = acquire_timeout
+        self.healthcheck_after = healthcheck_after
+        self._idle: List[Tuple[Any, float]] = []
+        self._checked_out = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {'hits': 0, 'misses': 0, 'reconnects': 0, 'discarded': 0, 'waits': 0}
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while not self._idle and self._checked_out >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f'No free connection after {self.acquire_timeout}s (max {self.max_size})')
+                self._stats['waits'] += 1
+                self._cond.wait(remaining)
+            self._checked_out += 1
+            idle = self._idle.pop() if self._idle else None
+
+        try:
+            if idle is not None:
+                conn, released_at = idle
+                if self._is_healthy(conn, released_at):
+                    self._count('hits')
+                    return conn
+                self._close_quietly(conn)
+                self._count('reconnects')
+            else:
+                self._count('misses')
+            import psycopg2
+            with timed('db_connect'):
+                conn = psycopg2.connect(self.dsn, connection_factory=connection_factory())
+            self._log('connect')
+            return conn
+        except Exception:
+            with self._cond:
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard: bool = False) -> None:
+        import psycopg2.extensions
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        else:
+            discard = True
+
+        if discard:
+            self._close_quietly(conn)
+            self._count('discarded')
+
+        with self._cond:
+            self._checked_out -= 1
+            if not discard:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self._stats, idle=len(self._idle), checked_out=self._checked_out, max_size=self.max_size)
+
+    def _is_healthy(self, conn, released_at: float) -> bool:
+        import psycopg2
+        if conn.closed:
+            return False
+        if time.monotonic() - released_at < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _count(self, name: str) -> None:
+        with self._cond:
+            self._stats[name] += 1
+
+    def _close_quietly(self, conn) -> None:
+        import psycopg2
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _log(self, event: str) -> None:
+        print(json.dumps({'event': f'db_pool.{event}', **self.stats()}))
+
+class ReplicaPool(ConnectionPool):
+    '''Pool for one replica, with the last measured lag and a cool-down after connection failures.'''
+
+    def __init__(self, dsn: str, max_size: int, acquire_timeout: float, healthcheck_after: float):
+        super().__init__(dsn, max_size, acquire_timeout, healthcheck_after)
+        self.lag = 0.0
+        self.lag_checked_at = float('-inf')
+        self.down_until = 0.0
+        self._stats.update(reads=0, lagging=0, behind_lsn=0, down=0)
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self) -> None:
+        self.down_until = time.monotonic() + REPLICA_RETRY_AFTER
+        self._count('down')
+        self._log('replica_down')
+
+    def is_usable(self, conn, min_lsn: Optional[str]) -> bool:
+        '''Lag is re-measured every REPLICA_LAG_CHECK_INTERVAL, or on every read that needs min_lsn.'''
+        if min_lsn is None and time.monotonic() - self.lag_checked_at < REPLICA_LAG_CHECK_INTERVAL:
+            caught_up = True
+        else:
+            with conn.cursor() as cur:
+                cur.execute(REPLICA_STATUS_SQL, (min_lsn or '0/0',))
+                lag, caught_up = cur.fetchone()
+            conn.rollback()
+            self.lag = float(lag)
+            self.lag_checked_at = time.monotonic()
+
+        if self.lag > REPLICA_MAX_LAG_SECONDS:
+            self._count('lagging')
+            return False
+        if not caught_up:
+            self._count('behind_lsn')
+            return False
+        self._count('reads')
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), lag_seconds=self.lag, available=self.available())
+
+pool = ConnectionPool(DATABASE_URL, DB_POOL_MAX_SIZE, DB_POOL_ACQUIRE_TIMEOUT, DB_POOL_HEALTHCHECK_AFTER)
+replica_pools = [
+    ReplicaPool(dsn, DB_POOL_MAX_SIZE, DB_POOL_ACQUIRE_TIMEOUT, DB_POOL_HEALTHCHECK_AFTER)
+    for dsn in DATABASE_REPLICA_URLS
+]
+_replica_turn = itertools.count()
+_primary_fallbacks = 0
+_fallbacks_lock = threading.Lock()
+
+def is_connection_error(error: Exception) -> bool:
+    import psycopg2
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+def dict_cursor(conn, **kwargs: Any):
+    '''Cursor returning RealDictRow rows; psycopg2.extras is only loaded once a query needs it.'''
+    from psycopg2.extras import RealDictCursor
+    return conn.cursor(cursor_factory=RealDictCursor, **kwargs)
+
+def acquire_replica(min_lsn: Optional[str]) -> Optional[Tuple[ReplicaPool, Any]]:
+    '''
+    Round-robin over available replicas and return the first one that is within
+    REPLICA_MAX_LAG_SECONDS and has replayed min_lsn. A replica that refuses
+    connections is skipped for REPLICA_RETRY_AFTER seconds.
+    '''
+    global _primary_fallbacks
+    start = next(_replica_turn)
+    for offset in range(len(replica_pools)):
+        replica = replica_pools[(start + offset) % len(replica_pools)]
+        if not replica.available():
+            continue
+        try:
+            conn = replica.acquire()
+        except PoolExhausted:
+            continue
+        except Exception as error:
+            if not is_connection_error(error):
+                raise
+            replica.mark_down()
+            continue
+        try:
+            if replica.is_usable(conn, min_lsn):
+                return replica, conn
+        except Exception as error:
+            replica.release(conn, discard=True)
+            if not is_connection_error(error):
+                raise
+            replica.mark_down()
+            continue
+        replica.release(conn)
+    with _fallbacks_lock:
+        _primary_fallbacks += 1
+    return None
+
+@contextmanager
+def db_connection(readonly: bool = False, min_lsn: Optional[str] = None) -> Iterator[Any]:
+    '''
+    Pooled connection to the primary. With readonly=True and replicas configured,
+    a replica connection is returned instead when one is healthy and caught up.
+    '''
+    target = None
+    with timed('db_acquire'):
+        if readonly and replica_pools:
+            target = acquire_replica(min_lsn)
+        if target is None:
+            target = (pool, pool.acquire())
+    owner, conn = target
+    broken = False
+    try:
+        yield conn
+    except Exception as error:
+        broken = is_connection_error(error)
+        raise
+    finally:
+        owner.release(conn, discard=broken or bool(conn.closed))
+
+def read_after_lsn(event: Dict[str, Any]) -> Optional[str]:
+    '''WAL position the client last wrote at, from the X-Write-LSN request header.'''
+    value = get_request_header(event, WRITE_LSN_HEADER).strip()
+    return value if _LSN.match(value) else None
+
+def track_write(conn, headers: Dict[str, str]) -> None:
+    '''
+    Call after commit: sets X-Write-LSN to the primary WAL position, which the
+    client sends back so its next reads see this write. No-op without replicas.
+    '''
+    if not replica_pools:
+        return
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_current_wal_lsn()::text')
+        headers[WRITE_LSN_HEADER] = cur.fetchone()[0]
+    conn.rollback()
+
+def pool_stats() -> Dict[str, int]:
+    return pool.stats()
+
+def replica_stats() -> Dict[str, Any]:
+    return {
+        'replicas': [replica.stats() for replica in replica_pools],
+        'primary_fallbacks': _primary_fallbacks
+    }
@@ -7,22 +7,142 @@ import json
 import os
 import hashlib
 import secrets
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from db import db_connection, dict_cursor, pool_stats
+from instrumentation import instrumented
+from passwords import hash_password, verify_password, verify_dummy
+from ratelimit import (
+    RATE_LIMIT_SHARED, check_limits, limiter_stats, lockouts,
+    shared_clear, shared_locked_for, shared_record_failure
+)
+from responses import get_request_header, with_compression
+from runtime import error_response, get_json_body, json_response, route
+from serialization import dumps
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
+SESSION_TTL_HOURS = int(os.environ.get('SESSION_TTL_HOURS', '12'))
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '60'))
+SESSION_CACHE_MAX_SIZE = int(os.environ.get('SESSION_CACHE_MAX_SIZE', '10000'))
+ADMIN_ROLES = ('admin', 'superadmin')
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+class SessionCache:
+    '''
+    LRU cache of validated sessions keyed by token hash.
+    Entries live at most SESSION_CACHE_TTL seconds and never past session expiry,
+    so a revocation made on another instance is picked up within that window.
+    '''
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None:
+                return None
+            valid_until, user = entry
+            if valid_until <= time.time():
+                del self._entries[token_hash]
+                return None
+            self._entries.move_to_end(token_hash)
+            return user
+
+    def put(self, token_hash: str, user: Dict[str, Any], expires_in: float) -> None:
+        # expires_in is measured by the database, so the clocks and time zones never mix
+        valid_until = time.time() + min(self.ttl, expires_in)
+        with self._lock:
+            self._entries[token_hash] = (valid_until, user)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token_hash: str) -> None:
+        with self._lock:
+            self._entries.pop(token_hash, None)
+
+session_cache = SessionCache(SESSION_CACHE_MAX_SIZE, SESSION_CACHE_TTL)
 
 def generate_token() -> str:
     return secrets.token_urlsafe(32)
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def get_auth_token(event: Dict[str, Any]) -> str:
+    headers = event.get('headers') or {}
+    return headers.get('X-Auth-Token') or headers.get('x-auth-token') or ''
+
+def get_client_ip(event: Dict[str, Any]) -> str:
+    # The gateway-reported address cannot be forged by the client, X-Forwarded-For is a fallback
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    forwarded = get_request_header(event, 'X-Forwarded-For').split(',')[0].strip()
+    return identity.get('sourceIp') or forwarded or 'unknown'
+
+def too_many_requests(retry_after: float) -> Dict[str, Any]:
+    seconds = max(1, int(retry_after + 0.999))
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Retry-After',
+            'Retry-After': str(seconds)
+        },
+        'body': json.dumps({'error': 'Too many attempts, try again later', 'retry_after': seconds}),
+        'isBase64Encoded': False
+    }
+
+def create_session(conn, user_id: int) -> Tuple[str, str]:
+    '''Insert a session and return (token, expires_at); the expiry is computed on the database clock.'''
+    token = generate_token()
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO sessions (token_hash, user_id, expires_at)
+            VALUES (%s, %s, CURRENT_TIMESTAMP + make_interval(hours => %s))
+            RETURNING expires_at
+            """,
+            (hash_token(token), user_id, SESSION_TTL_HOURS)
+        )
+        expires_at = cur.fetchone()[0]
+    return token, str(expires_at)
+
+def lookup_session(token: str) -> Optional[Dict[str, Any]]:
+    token_hash = hash_token(token)
+    user = session_cache.get(token_hash)
+    if user is not None:
+        return user
+    
+    with db_connection() as conn:
+        cur = dict_cursor(conn)
+        cur.execute(
+            """
+            SELECT EXTRACT(EPOCH FROM s.expires_at - LOCALTIMESTAMP) as expires_in, u.id, u.email, u.full_name, u.role, u.department, u.position
+            FROM sessions s
+            JOIN users u ON s.user_id = u.id
+            WHERE s.token_hash = %s AND s.revoked_at IS NULL
+              AND s.expires_at > CURRENT_TIMESTAMP AND u.is_active = true
+            """,
+            (token_hash,)
+        )
+        row = cur.fetchone()
+        cur.close()
+    
+    if not row:
+        return None
+    
+    user = dict(row)
+    expires_in = float(user.pop('expires_in'))
+    session_cache.put(token_hash, user, expires_in)
+    return user
 
+@instrumented
+@with_compression
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Handle user authentication and authorization
@@ -30,42 +150,48 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context with request_id, function_name attributes
     Returns: HTTP response with auth result
     '''
-    method: str = event.get('httpMethod', 'GET')
+    return route(event, {'GET': handle_get, 'POST': handle_post}, allow_headers='Content-Type, X-Auth-Token')
+
+def handle_get(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    path = (event.get('queryStringParameters') or {}).get('action', '')
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    if path == 'metrics':
+        return get_metrics(get_auth_token(event), headers)
     
-    path = event.get('queryStringParameters', {}).get('action', '')
+    return error_response(400, 'Invalid request', headers)
+
+def get_metrics(token: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    '''Rate-limit and lockout counters reveal who is being throttled, so admins only.'''
+    caller = lookup_session(token) if token else None
     
-    if method == 'POST':
-        body_data = json.loads(event.get('body', '{}'))
-        
-        if path == 'register':
-            return register_user(body_data)
-        elif path == 'login':
-            return login_user(body_data)
-        elif path == 'validate':
-            token = event.get('headers', {}).get('x-auth-token', '')
-            return validate_token(token)
+    if not caller:
+        return error_response(401, 'Invalid token', headers)
+    if caller['role'] not in ADMIN_ROLES:
+        return error_response(403, 'Insufficient permissions', headers)
     
-    return {
-        'statusCode': 400,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Invalid request'}),
-        'isBase64Encoded': False
-    }
+    return json_response(200, {'rate_limits': limiter_stats(), 'db_pool': pool_stats()}, headers)
 
-def register_user(data: Dict[str, Any]) -> Dict[str, Any]:
+def handle_post(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    path = (event.get('queryStringParameters') or {}).get('action', '')
+    body_data = get_json_body(event)
+    
+    if not isinstance(body_data, dict):
+        return error_response(400, 'Request body must be a JSON object', headers)
+    
+    if path == 'register':
+        return register_user(body_data, get_client_ip(event))
+    elif path == 'login':
+        return login_user(body_data, get_client_ip(event))
+    elif path == 'validate':
+        return validate_token(get_auth_token(event))
+    elif path == 'logout':
+        return logout_user(get_auth_token(event))
+    elif path == 'revoke':
+        return revoke_sessions(get_auth_token(event), body_data)
+    
+    return error_response(400, 'Invalid request', headers)
+
+def register_user(data: Dict[str, Any], client_ip: str) -> Dict[str, Any]:
     email = data.get('email', '').strip().lower()
     password = data.get('password', '')
     full_name = data.get('full_name', '')
@@ -80,54 +206,58 @@ def register_user(data: Dict[str, Any]) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cur.execute("SELECT id FROM users WHERE email = %s", (email,))
-    existing = cur.fetchone()
-    
-    if existing:
-        cur.close()
-        conn.close()
-        return {
-            'statusCode': 409,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'User already exists'}),
-            'isBase64Encoded': False
-        }
+    retry_after = check_limits(client_ip, email)
+    if retry_after:
+        return too_many_requests(retry_after)
     
+    # Hash before taking a pooled connection so the KDF cost is not spent holding it
     password_hash = hash_password(password)
-    role = 'user'
     
-    cur.execute(
-        "INSERT INTO users (email, password_hash, full_name, role, department, position) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id, email, full_name, role",
-        (email, password_hash, full_name, role, department, position)
-    )
-    user = cur.fetchone()
-    conn.commit()
-    
-    token = generate_token()
-    cur.execute(
-        "INSERT INTO notifications (user_id, title, message, type) VALUES (%s, %s, %s, %s)",
-        (user['id'], 'Добро пожаловать!', 'Вы успешно зарегистрированы в системе АСУБТ', 'info')
-    )
-    conn.commit()
-    
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = dict_cursor(conn)
+        
+        cur.execute("SELECT id FROM users WHERE email = %s", (email,))
+        existing = cur.fetchone()
+        
+        if existing:
+            cur.close()
+            return {
+                'statusCode': 409,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'User already exists'}),
+                'isBase64Encoded': False
+            }
+        
+        role = 'user'
+        
+        cur.execute(
+            "INSERT INTO users (email, password_hash, full_name, role, department, position) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id, email, full_name, role",
+            (email, password_hash, full_name, role, department, position)
+        )
+        user = cur.fetchone()
+        
+        token, expires_at = create_session(conn, user['id'])
+        cur.execute(
+            "INSERT INTO notifications (user_id, title, message, type) VALUES (%s, %s, %s, %s)",
+            (user['id'], 'Добро пожаловать!', 'Вы успешно зарегистрированы в системе АСУБТ', 'info')
+        )
+        conn.commit()
+        
+        cur.close()
     
     return {
         'statusCode': 201,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({
+        'body': dumps({
             'success': True,
             'token': token,
+            'expires_at': expires_at,
             'user': dict(user)
         }),
         'isBase64Encoded': False
     }
 
-def login_user(data: Dict[str, Any]) -> Dict[str, Any]:
+def login_user(data: Dict[str, Any], client_ip: str) -> Dict[str, Any]:
     email = data.get('email', '').strip().lower()
     password = data.get('password', '')
     
@@ -139,21 +269,41 @@ def login_user(data: Dict[str, Any]) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    # Throttled and locked-out attempts are shed here, before a pooled connection is taken
+    retry_after = check_limits(client_ip, email)
+    if retry_after:
+        return too_many_requests(retry_after)
     
-    password_hash = hash_password(password)
+    with db_connection() as conn:
+        cur = dict_cursor(conn)
+        cur.execute(
+            "SELECT id, email, full_name, role, department, position, is_active, password_hash FROM users WHERE email = %s",
+            (email,)
+        )
+        user = cur.fetchone()
+        locked_for = shared_locked_for(cur, email) if RATE_LIMIT_SHARED else 0.0
+        cur.close()
     
-    cur.execute(
-        "SELECT id, email, full_name, role, department, position, is_active FROM users WHERE email = %s AND password_hash = %s",
-        (email, password_hash)
-    )
-    user = cur.fetchone()
+    if locked_for:
+        lockouts.apply(email, locked_for)
+        return too_many_requests(locked_for)
     
-    cur.close()
-    conn.close()
+    # Unknown emails still pay for one hash so timing does not reveal registered accounts
+    if user:
+        valid, needs_rehash = verify_password(password, user.pop('password_hash'))
+    else:
+        verify_dummy(password)
+        valid, needs_rehash = False, False
     
-    if not user:
+    if not valid:
+        locked_for = lockouts.record_failure(email)
+        if RATE_LIMIT_SHARED:
+            with db_connection() as conn:
+                cur = conn.cursor()
+                locked_for = shared_record_failure(cur, email)
+                conn.commit()
+                cur.close()
+            lockouts.apply(email, locked_for)
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -169,21 +319,82 @@ def login_user(data: Dict[str, Any]) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    token = generate_token()
+    # Legacy or outdated-cost hashes are replaced while the plaintext is at hand
+    new_hash = hash_password(password) if needs_rehash else None
+    lockouts.record_success(email)
+    
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if new_hash:
+            cur.execute("UPDATE users SET password_hash = %s WHERE id = %s", (new_hash, user['id']))
+        if RATE_LIMIT_SHARED:
+            shared_clear(cur, email)
+        token, expires_at = create_session(conn, user['id'])
+        conn.commit()
+        cur.close()
     
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({
+        'body': dumps({
             'success': True,
             'token': token,
+            'expires_at': expires_at,
             'user': dict(user)
         }),
         'isBase64Encoded': False
     }
 
 def validate_token(token: str) -> Dict[str, Any]:
-    if not token or len(token) < 10:
+    user = lookup_session(token) if token else None
+    
+    if not user:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Invalid token'}),
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': dumps({'valid': True, 'user': user}),
+        'isBase64Encoded': False
+    }
+
+def logout_user(token: str) -> Dict[str, Any]:
+    if not token:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Invalid token'}),
+            'isBase64Encoded': False
+        }
+    
+    token_hash = hash_token(token)
+    session_cache.invalidate(token_hash)
+    
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE sessions SET revoked_at = CURRENT_TIMESTAMP WHERE token_hash = %s AND revoked_at IS NULL",
+            (token_hash,)
+        )
+        conn.commit()
+        cur.close()
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True}),
+        'isBase64Encoded': False
+    }
+
+def revoke_sessions(token: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    caller = lookup_session(token) if token else None
+    
+    if not caller:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -191,9 +402,40 @@ def validate_token(token: str) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    try:
+        user_id = int(data.get('user_id') or caller['id'])
+    except (ValueError, TypeError):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'user_id must be an integer'}),
+            'isBase64Encoded': False
+        }
+    
+    if user_id != caller['id'] and caller['role'] not in ADMIN_ROLES:
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Insufficient permissions'}),
+            'isBase64Encoded': False
+        }
+    
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE sessions SET revoked_at = CURRENT_TIMESTAMP WHERE user_id = %s AND revoked_at IS NULL RETURNING token_hash",
+            (user_id,)
+        )
+        revoked = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        cur.close()
+    
+    for token_hash in revoked:
+        session_cache.invalidate(token_hash)
+    
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'valid': True}),
+        'body': json.dumps({'success': True, 'revoked': len(revoked)}),
         'isBase64Encoded': False
     }
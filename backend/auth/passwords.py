@@ -0,0 +1,71 @@
+'''
+Password hashing for ASUBT auth function
+Salted scrypt hashes with the cost parameters stored in the hash string:
+scrypt$<n>$<r>$<p>$<salt b64>$<digest b64>
+Legacy unsalted SHA-256 hex hashes are still verified so they can be upgraded on login.
+'''
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from typing import Tuple
+
+PASSWORD_SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', '8'))
+PASSWORD_SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', '1'))
+SALT_BYTES = 16
+DIGEST_BYTES = 32
+
+def scrypt_digest(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=256 * n * r * p + 1024 * 1024,
+        dklen=DIGEST_BYTES
+    )
+
+def hash_password(password: str, n: int = PASSWORD_SCRYPT_N, r: int = PASSWORD_SCRYPT_R, p: int = PASSWORD_SCRYPT_P) -> str:
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = scrypt_digest(password, salt, n, r, p)
+    return '$'.join([
+        'scrypt', str(n), str(r), str(p),
+        base64.b64encode(salt).decode('ascii'),
+        base64.b64encode(digest).decode('ascii')
+    ])
+
+def verify_password(password: str, stored_hash: str) -> Tuple[bool, bool]:
+    '''
+    Returns (valid, needs_rehash). needs_rehash is set for legacy SHA-256 hashes
+    and for scrypt hashes made with cost parameters other than the current ones.
+    '''
+    if stored_hash.startswith('scrypt$'):
+        try:
+            _, n, r, p, salt, digest = stored_hash.split('$')
+            expected = base64.b64decode(digest)
+            computed = scrypt_digest(password, base64.b64decode(salt), int(n), int(r), int(p))
+        except (ValueError, TypeError):
+            return False, False
+        valid = hmac.compare_digest(computed, expected)
+        current = (int(n), int(r), int(p)) == (PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+        return valid, valid and not current
+
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    valid = hmac.compare_digest(legacy.encode(), stored_hash.encode())
+    return valid, valid
+
+_dummy_hash = ''
+
+def verify_dummy(password: str) -> None:
+    '''
+    Burn the same scrypt cost as a real check when the email is unknown,
+    so response time does not reveal which accounts exist.
+    '''
+    global _dummy_hash
+    if not _dummy_hash:
+        _dummy_hash = hash_password(secrets.token_urlsafe(16))
+    verify_password(password, _dummy_hash)
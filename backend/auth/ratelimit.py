@@ -0,0 +1,184 @@
+'''
+Rate limiting for ASUBT auth function
+Token buckets keyed by client IP and by email, plus progressive lockout after
+repeated failed logins. State lives in process memory so rejected requests never
+touch the database; lockouts can optionally be shared between instances through
+the auth_lockouts table (RATE_LIMIT_SHARED=1).
+'''
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '50000'))
+RATE_LIMIT_IP_CAPACITY = float(os.environ.get('RATE_LIMIT_IP_CAPACITY', '30'))
+RATE_LIMIT_IP_REFILL = float(os.environ.get('RATE_LIMIT_IP_REFILL', '0.5'))
+RATE_LIMIT_EMAIL_CAPACITY = float(os.environ.get('RATE_LIMIT_EMAIL_CAPACITY', '5'))
+RATE_LIMIT_EMAIL_REFILL = float(os.environ.get('RATE_LIMIT_EMAIL_REFILL', '0.05'))
+RATE_LIMIT_SHARED = os.environ.get('RATE_LIMIT_SHARED', '') in ('1', 'true', 'yes')
+
+LOCKOUT_THRESHOLD = int(os.environ.get('LOGIN_LOCKOUT_THRESHOLD', '5'))
+LOCKOUT_BASE_SECONDS = float(os.environ.get('LOGIN_LOCKOUT_BASE_SECONDS', '30'))
+LOCKOUT_MAX_SECONDS = float(os.environ.get('LOGIN_LOCKOUT_MAX_SECONDS', '3600'))
+
+class TokenBucketLimiter:
+    '''
+    One bucket per key holding up to capacity tokens, refilled continuously.
+    The least recently seen keys are evicted beyond max_keys; an evicted key
+    simply starts again with a full bucket.
+    '''
+
+    def __init__(self, name: str, capacity: float, refill_per_second: float, max_keys: int):
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'allowed': 0, 'dropped': 0}
+
+    def take(self, key: str) -> float:
+        '''Returns 0 when the request may proceed, otherwise seconds until a token is available.'''
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_per_second)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+                self._stats['allowed'] += 1
+            else:
+                retry_after = (1 - tokens) / self.refill_per_second if self.refill_per_second > 0 else LOCKOUT_MAX_SECONDS
+                self._stats['dropped'] += 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, keys=len(self._buckets))
+
+def lockout_seconds(failures: int) -> float:
+    if failures < LOCKOUT_THRESHOLD:
+        return 0.0
+    return min(LOCKOUT_MAX_SECONDS, LOCKOUT_BASE_SECONDS * 2 ** (failures - LOCKOUT_THRESHOLD))
+
+class LockoutTracker:
+    '''
+    Counts consecutive failed logins per key. From LOCKOUT_THRESHOLD failures on,
+    the key is locked for a period that doubles with every further failure.
+    Failures are forgotten after LOCKOUT_MAX_SECONDS without a new one.
+    '''
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._entries: 'OrderedDict[str, Tuple[int, float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'failures': 0, 'lockouts': 0, 'rejected': 0}
+
+    def locked_for(self, key: str) -> float:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= now:
+                return 0.0
+            self._stats['rejected'] += 1
+            return entry[2] - now
+
+    def record_failure(self, key: str) -> float:
+        now = time.time()
+        with self._lock:
+            failures, last_failure_at, locked_until = self._entries.get(key, (0, now, 0.0))
+            if now - last_failure_at > LOCKOUT_MAX_SECONDS:
+                failures = 0
+            failures += 1
+            duration = lockout_seconds(failures)
+            if duration:
+                locked_until = max(locked_until, now + duration)
+                self._stats['lockouts'] += 1
+            self._stats['failures'] += 1
+            self._store(key, (failures, now, locked_until))
+            return max(0.0, locked_until - now)
+
+    def apply(self, key: str, remaining: float) -> None:
+        '''Mirror a lockout found in the shared table so the next attempt is shed in memory.'''
+        if remaining <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            failures, last_failure_at, locked_until = self._entries.get(key, (LOCKOUT_THRESHOLD, now, 0.0))
+            self._store(key, (failures, last_failure_at, max(locked_until, now + remaining)))
+
+    def record_success(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, keys=len(self._entries))
+
+    def _store(self, key: str, entry: Tuple[int, float, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+ip_limiter = TokenBucketLimiter('ip', RATE_LIMIT_IP_CAPACITY, RATE_LIMIT_IP_REFILL, RATE_LIMIT_MAX_KEYS)
+email_limiter = TokenBucketLimiter('email', RATE_LIMIT_EMAIL_CAPACITY, RATE_LIMIT_EMAIL_REFILL, RATE_LIMIT_MAX_KEYS)
+lockouts = LockoutTracker(RATE_LIMIT_MAX_KEYS)
+
+def check_limits(client_ip: str, email: str) -> float:
+    '''Returns 0 when the attempt may go ahead, otherwise the Retry-After in seconds.'''
+    locked = lockouts.locked_for(email)
+    if locked:
+        return locked
+    return ip_limiter.take(client_ip) or email_limiter.take(email)
+
+def limiter_stats() -> Dict[str, Any]:
+    return {
+        'ip': ip_limiter.stats(),
+        'email': email_limiter.stats(),
+        'lockouts': lockouts.stats(),
+        'shared': RATE_LIMIT_SHARED
+    }
+
+def shared_locked_for(cur, email: str) -> float:
+    cur.execute(
+        "SELECT EXTRACT(EPOCH FROM locked_until - CURRENT_TIMESTAMP) FROM auth_lockouts WHERE email = %s AND locked_until > CURRENT_TIMESTAMP",
+        (email,)
+    )
+    row = cur.fetchone()
+    return float(row[0]) if row else 0.0
+
+def shared_record_failure(cur, email: str) -> float:
+    '''Counts the failure across instances and returns the remaining lockout in seconds.'''
+    cur.execute(
+        """
+        INSERT INTO auth_lockouts AS l (email, failures, last_failure_at)
+        VALUES (%(email)s, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (email) DO UPDATE SET
+            failures = CASE
+                WHEN l.last_failure_at < CURRENT_TIMESTAMP - make_interval(secs => %(window)s) THEN 1
+                ELSE l.failures + 1
+            END,
+            last_failure_at = CURRENT_TIMESTAMP
+        RETURNING failures, EXTRACT(EPOCH FROM COALESCE(locked_until, CURRENT_TIMESTAMP) - CURRENT_TIMESTAMP)
+        """,
+        {'email': email, 'window': LOCKOUT_MAX_SECONDS}
+    )
+    failures, remaining = cur.fetchone()
+    duration = lockout_seconds(failures)
+    if duration > float(remaining):
+        cur.execute(
+            "UPDATE auth_lockouts SET locked_until = CURRENT_TIMESTAMP + make_interval(secs => %s) WHERE email = %s",
+            (duration, email)
+        )
+        return duration
+    return max(0.0, float(remaining))
+
+def shared_clear(cur, email: str) -> None:
+    cur.execute("DELETE FROM auth_lockouts WHERE email = %s", (email,))
@@ -3,18 +3,87 @@ Backend function for document management in ASUBT system
 Handles: create, read, update, delete documents
 '''
 
+import base64
+import hashlib
+import html
 import json
-import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from db import db_connection, dict_cursor, read_after_lsn, track_write
+from instrumentation import instrumented
+from responses import get_request_header, with_compression
+from runtime import route
+from serialization import dumps, row_to_dict, rows_to_dicts
+from versions import insert_version, list_versions, load_version, pack, record_version
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_SEARCH_RESULTS = 100
+MAX_BATCH_IDS = 100
+MAX_INT4 = 2 ** 31 - 1
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+DOCUMENT_COLUMNS = "d.id, d.title, d.doc_type, d.content, d.file_url, d.version, d.created_by, d.created_at, d.updated_at, d.status"
 
+# Listing projection: stored length and preview instead of the TOASTed content body
+COMPACT_DOCUMENT_COLUMNS = "d.id, d.title, d.doc_type, d.file_url, d.version, d.created_by, d.created_at, d.updated_at, d.status, d.content_length, d.content_preview"
+
+# ts_headline marks matches with control characters that cannot come from the stored text
+# (they are stripped before highlighting); the text is HTML-escaped and only then are the
+# markers turned into <mark> tags, so document content can never inject markup
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+TITLE_HIGHLIGHT_OPTIONS = f'HighlightAll=true, StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}"'
+SNIPPET_OPTIONS = f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}", MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=" … "'
+
+def encode_cursor(created_at: Optional[Any], doc_id: int) -> str:
+    sort_key = str(created_at) if created_at else 'infinity'
+    raw = json.dumps([sort_key, doc_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    created_at, doc_id = json.loads(raw)
+    if created_at != 'infinity':
+        datetime.fromisoformat(created_at)
+    return created_at, int(doc_id)
+
+def parse_ids(value: str) -> List[int]:
+    ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    if not ids or len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f'ids must list 1 to {MAX_BATCH_IDS} documents')
+    return ids
+
+def parse_page_size(value: Optional[str]) -> int:
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+def compute_etag(cur, tables: Tuple[str, ...], params: Dict[str, Any]) -> str:
+    cur.execute(
+        "SELECT table_name, version FROM table_versions WHERE table_name = ANY(%s) ORDER BY table_name",
+        (list(tables),)
+    )
+    versions = [list(row) for row in cur.fetchall()]
+    fingerprint = json.dumps([versions, sorted(params.items())])
+    # Weak: with_compression serves gzip, br and identity bodies under the same tag
+    return 'W/"' + hashlib.sha1(fingerprint.encode()).hexdigest()[:20] + '"'
+
+def etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    '''If-None-Match uses weak comparison, so the W/ prefix is ignored on both sides.'''
+    if_none_match = get_request_header(event, 'If-None-Match')
+    opaque_tag = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') in (opaque_tag, '*') for tag in if_none_match.split(',')) if if_none_match else False
+
+def not_modified(headers: Dict[str, str], etag: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': dict(headers, ETag=etag),
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+@instrumented
+@with_compression
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Manage documents in ASUBT system
@@ -22,95 +91,287 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context with request_id, function_name attributes
     Returns: HTTP response with operation result
     '''
-    method: str = event.get('httpMethod', 'GET')
+    return route(
+        event,
+        {'GET': get_documents, 'POST': create_document, 'PUT': update_document, 'DELETE': delete_document},
+        allow_headers='Content-Type, X-Auth-Token, X-User-Id, If-None-Match, X-Write-LSN',
+        expose_headers='ETag, X-Write-LSN'
+    )
+
+def get_documents(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    params = event.get('queryStringParameters') or {}
+    doc_id = params.get('id')
+    doc_type = params.get('type')
+    search_query = (params.get('q') or '').strip()
+    
+    if search_query:
+        return search_documents(event, search_query, doc_type, params.get('limit'), headers)
+    
+    if doc_id and ('versions' in params or params.get('version')):
+        return get_document_history(event, doc_id, params.get('version'), headers)
+    
+    if params.get('ids'):
+        return get_documents_batch(event, params['ids'], headers)
     
-    if method == 'OPTIONS':
+    try:
+        page_size = parse_page_size(params.get('limit'))
+        cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+    except (ValueError, TypeError):
         return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Invalid cursor or limit'}),
             'isBase64Encoded': False
         }
     
-    headers = {
-        'Content-Type': 'application/json',
-        'Access-Control-Allow-Origin': '*'
-    }
+    columns = COMPACT_DOCUMENT_COLUMNS if params.get('view') == 'compact' else DOCUMENT_COLUMNS
     
-    if method == 'GET':
-        return get_documents(event, headers)
-    elif method == 'POST':
-        return create_document(event, headers)
-    elif method == 'PUT':
-        return update_document(event, headers)
-    elif method == 'DELETE':
-        return delete_document(event, headers)
+    with db_connection(readonly=True, min_lsn=read_after_lsn(event)) as conn:
+        cur = conn.cursor()
+        
+        etag = compute_etag(cur, ('documents', 'users'), params)
+        if etag_matches(event, etag):
+            cur.close()
+            return not_modified(headers, etag)
+        etag_headers = dict(headers, ETag=etag)
+        
+        if doc_id:
+            cur.execute(
+                f"SELECT {DOCUMENT_COLUMNS}, u.full_name as creator_name FROM documents d LEFT JOIN users u ON d.created_by = u.id WHERE d.id = %s",
+                (doc_id,)
+            )
+            document = row_to_dict(cur, cur.fetchone())
+            cur.close()
+            
+            if not document:
+                return {
+                    'statusCode': 404,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Document not found'}),
+                    'isBase64Encoded': False
+                }
+            
+            return {
+                'statusCode': 200,
+                'headers': etag_headers,
+                'body': dumps({'document': document}),
+                'isBase64Encoded': False
+            }
+        
+        query = f"SELECT {columns}, u.full_name as creator_name FROM documents d LEFT JOIN users u ON d.created_by = u.id WHERE d.status = 'active'"
+        params_list = []
+        
+        if doc_type:
+            query += " AND d.doc_type = %s"
+            params_list.append(doc_type)
+        
+        if cursor:
+            query += " AND (COALESCE(d.created_at, 'infinity'::timestamp), d.id) < (%s::timestamp, %s)"
+            params_list.extend(cursor)
+        
+        query += " ORDER BY COALESCE(d.created_at, 'infinity'::timestamp) DESC, d.id DESC LIMIT %s"
+        params_list.append(page_size + 1)
+        
+        cur.execute(query, params_list)
+        documents = rows_to_dicts(cur, cur.fetchall())
+        cur.close()
+    
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_cursor = encode_cursor(documents[-1]['created_at'], documents[-1]['id'])
     
     return {
-        'statusCode': 405,
-        'headers': headers,
-        'body': json.dumps({'error': 'Method not allowed'}),
+        'statusCode': 200,
+        'headers': etag_headers,
+        'body': dumps({'documents': documents, 'next_cursor': next_cursor}),
         'isBase64Encoded': False
     }
 
-def get_documents(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    params = event.get('queryStringParameters') or {}
-    doc_id = params.get('id')
-    doc_type = params.get('type')
-    
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+def get_documents_batch(event: Dict[str, Any], ids_param: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    try:
+        doc_ids = parse_ids(ids_param)
+    except ValueError as error:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': str(error)}),
+            'isBase64Encoded': False
+        }
     
-    if doc_id:
+    with db_connection(readonly=True, min_lsn=read_after_lsn(event)) as conn:
+        cur = conn.cursor()
+        
+        etag = compute_etag(cur, ('documents', 'users'), event.get('queryStringParameters') or {})
+        if etag_matches(event, etag):
+            cur.close()
+            return not_modified(headers, etag)
+        etag_headers = dict(headers, ETag=etag)
+        
         cur.execute(
-            "SELECT d.*, u.full_name as creator_name FROM documents d LEFT JOIN users u ON d.created_by = u.id WHERE d.id = %s",
-            (doc_id,)
+            f"SELECT {DOCUMENT_COLUMNS}, u.full_name as creator_name FROM documents d LEFT JOIN users u ON d.created_by = u.id WHERE d.id = ANY(%s)",
+            (doc_ids,)
         )
-        document = cur.fetchone()
+        documents = rows_to_dicts(cur, cur.fetchall())
         cur.close()
-        conn.close()
+    
+    # Keep the order the client asked for
+    by_id = {document['id']: document for document in documents}
+    
+    return {
+        'statusCode': 200,
+        'headers': etag_headers,
+        'body': dumps({
+            'documents': [by_id[doc_id] for doc_id in doc_ids if doc_id in by_id],
+            'missing': [doc_id for doc_id in doc_ids if doc_id not in by_id]
+        }),
+        'isBase64Encoded': False
+    }
+
+def highlight_markup(text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    return html.escape(text).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+
+def search_documents(event: Dict[str, Any], search_query: str, doc_type: Optional[str], limit: Optional[str], headers: Dict[str, str]) -> Dict[str, Any]:
+    try:
+        result_limit = max(1, min(int(limit or 20), MAX_SEARCH_RESULTS))
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Invalid limit'}),
+            'isBase64Encoded': False
+        }
+    
+    type_filter = "AND d.doc_type = %s" if doc_type else ""
+    params_list = [search_query] + ([doc_type] if doc_type else []) + [result_limit, TITLE_HIGHLIGHT_OPTIONS, SNIPPET_OPTIONS, HIGHLIGHT_START + HIGHLIGHT_STOP]
+    
+    # Rank on the GIN-matched rows only, then build highlighted snippets for the top page
+    query = f"""
+        WITH query AS (SELECT websearch_to_tsquery('russian', %s) AS q),
+        ranked AS (
+            SELECT d.id, ts_rank_cd(d.search_vector, query.q) AS rank
+            FROM documents d, query
+            WHERE d.status = 'active' AND d.search_vector @@ query.q {type_filter}
+            ORDER BY rank DESC, d.id DESC
+            LIMIT %s
+        )
+        SELECT d.id, d.title, d.doc_type, d.file_url, d.created_at, ranked.rank,
+               ts_headline('russian', translate(d.title, markers.chars, ''), query.q, %s) as title_highlight,
+               ts_headline('russian', translate(COALESCE(d.content, ''), markers.chars, ''), query.q, %s) as snippet
+        FROM ranked
+        JOIN documents d ON d.id = ranked.id
+        CROSS JOIN query
+        CROSS JOIN (SELECT %s::text AS chars) markers
+        ORDER BY ranked.rank DESC, ranked.id DESC
+    """
+    
+    with db_connection(readonly=True, min_lsn=read_after_lsn(event)) as conn:
+        cur = conn.cursor()
         
-        if not document:
-            return {
-                'statusCode': 404,
-                'headers': headers,
-                'body': json.dumps({'error': 'Document not found'}),
-                'isBase64Encoded': False
-            }
+        etag = compute_etag(cur, ('documents',), event.get('queryStringParameters') or {})
+        if etag_matches(event, etag):
+            cur.close()
+            return not_modified(headers, etag)
+        etag_headers = dict(headers, ETag=etag)
         
+        cur.execute(query, params_list)
+        results = rows_to_dicts(cur, cur.fetchall())
+        cur.close()
+    
+    for result in results:
+        result['title_highlight'] = highlight_markup(result['title_highlight'])
+        result['snippet'] = highlight_markup(result['snippet'])
+    
+    return {
+        'statusCode': 200,
+        'headers': etag_headers,
+        'body': dumps({'query': search_query, 'results': results}),
+        'isBase64Encoded': False
+    }
+
+def get_document_history(event: Dict[str, Any], doc_id: str, version: Optional[str], headers: Dict[str, str]) -> Dict[str, Any]:
+    try:
+        doc_id_value = int(doc_id)
+        version_number = int(version) if version else None
+    except ValueError:
         return {
-            'statusCode': 200,
+            'statusCode': 400,
             'headers': headers,
-            'body': json.dumps({'document': dict(document)}, default=str),
+            'body': json.dumps({'error': 'Invalid id or version'}),
             'isBase64Encoded': False
         }
     
-    query = "SELECT d.*, u.full_name as creator_name FROM documents d LEFT JOIN users u ON d.created_by = u.id WHERE d.status = 'active'"
-    params_list = []
-    
-    if doc_type:
-        query += " AND d.doc_type = %s"
-        params_list.append(doc_type)
+    with db_connection(readonly=True, min_lsn=read_after_lsn(event)) as conn:
+        cur = conn.cursor()
+        
+        etag = compute_etag(cur, ('documents',), event.get('queryStringParameters') or {})
+        if etag_matches(event, etag):
+            cur.close()
+            return not_modified(headers, etag)
+        etag_headers = dict(headers, ETag=etag)
+        
+        cur.execute(
+            "SELECT id, title, file_url, content, version, created_by, updated_at FROM documents WHERE id = %s",
+            (doc_id_value,)
+        )
+        document = row_to_dict(cur, cur.fetchone())
+        
+        if document and version_number is not None:
+            result = load_version(cur, doc_id_value, version_number)
+        elif document:
+            result = rows_to_dicts(cur, list_versions(cur, doc_id_value))
+        cur.close()
     
-    query += " ORDER BY d.created_at DESC LIMIT 100"
+    if not document:
+        return {
+            'statusCode': 404,
+            'headers': headers,
+            'body': json.dumps({'error': 'Document not found'}),
+            'isBase64Encoded': False
+        }
     
-    cur.execute(query, params_list)
-    documents = cur.fetchall()
-    cur.close()
-    conn.close()
+    # Documents never edited since history was introduced have no rows yet: their only version is the current one
+    if version_number is None:
+        if not result:
+            result = [{
+                'version': document['version'], 'kind': 'current', 'title': document['title'],
+                'content_length': len(document['content'] or ''), 'stored_bytes': None,
+                'created_by': document['created_by'], 'created_at': document['updated_at']
+            }]
+        body = {'document_id': doc_id_value, 'current_version': document['version'], 'versions': result}
+    else:
+        if result is None and version_number == document['version']:
+            result = {
+                'document_id': doc_id_value, 'version': version_number, 'title': document['title'],
+                'file_url': document['file_url'], 'content': document['content'] or '',
+                'created_by': document['created_by'], 'created_at': document['updated_at'], 'replayed_deltas': 0
+            }
+        if result is None:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({'error': 'Version not found'}),
+                'isBase64Encoded': False
+            }
+        body = {'document': result}
     
     return {
         'statusCode': 200,
-        'headers': headers,
-        'body': json.dumps({'documents': [dict(doc) for doc in documents]}, default=str),
+        'headers': etag_headers,
+        'body': dumps(body),
         'isBase64Encoded': False
     }
 
+def parse_user_id(data: Dict[str, Any], field: str, default: Optional[int] = None) -> Optional[int]:
+    value = data.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 < value <= MAX_INT4:
+        raise ValueError(f'{field} must be a positive integer')
+    return value
+
 def create_document(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
     body_data = json.loads(event.get('body', '{}'))
     
@@ -118,7 +379,16 @@ def create_document(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str,
     doc_type = body_data.get('doc_type', '').strip()
     content = body_data.get('content', '')
     file_url = body_data.get('file_url', '')
-    created_by = int(body_data.get('created_by', 1))
+    
+    try:
+        created_by = parse_user_id(body_data, 'created_by', default=1)
+    except ValueError as error:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': str(error)}),
+            'isBase64Encoded': False
+        }
     
     if not title or not doc_type:
         return {
@@ -128,22 +398,26 @@ def create_document(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str,
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cur.execute(
-        "INSERT INTO documents (title, doc_type, content, file_url, created_by) VALUES (%s, %s, %s, %s, %s) RETURNING id, title, doc_type, created_at",
-        (title, doc_type, content, file_url, created_by)
-    )
-    document = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = dict_cursor(conn)
+        
+        cur.execute(
+            "INSERT INTO documents (title, doc_type, content, file_url, created_by) VALUES (%s, %s, %s, %s, %s) RETURNING id, title, doc_type, version, created_at",
+            (title, doc_type, content, file_url, created_by)
+        )
+        document = cur.fetchone()
+        insert_version(
+            cur, document['id'], document['version'], 'snapshot', pack(content or ''),
+            {'title': title, 'file_url': file_url, 'content': content}, created_by
+        )
+        conn.commit()
+        track_write(conn, headers)
+        cur.close()
     
     return {
         'statusCode': 201,
         'headers': headers,
-        'body': json.dumps({'success': True, 'document': dict(document)}, default=str),
+        'body': dumps({'success': True, 'document': dict(document)}),
         'isBase64Encoded': False
     }
 
@@ -163,32 +437,54 @@ def update_document(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str,
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    updates = []
-    params = []
-    
-    if title:
-        updates.append("title = %s")
-        params.append(title)
-    if content is not None:
-        updates.append("content = %s")
-        params.append(content)
-    if file_url is not None:
-        updates.append("file_url = %s")
-        params.append(file_url)
-    
-    updates.append("updated_at = CURRENT_TIMESTAMP")
-    params.append(doc_id)
-    
-    query = f"UPDATE documents SET {', '.join(updates)} WHERE id = %s RETURNING id, title, updated_at"
+    try:
+        updated_by = parse_user_id(body_data, 'updated_by')
+    except ValueError as error:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': str(error)}),
+            'isBase64Encoded': False
+        }
     
-    cur.execute(query, params)
-    document = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = dict_cursor(conn)
+        
+        # Row lock keeps concurrent edits from branching the version chain
+        cur.execute("SELECT title, content, file_url, COALESCE(version, 1) as version FROM documents WHERE id = %s FOR UPDATE", (doc_id,))
+        previous = cur.fetchone()
+        
+        document = None
+        if previous:
+            updates = []
+            params = []
+            
+            if title:
+                updates.append("title = %s")
+                params.append(title)
+            if content is not None:
+                updates.append("content = %s")
+                params.append(content)
+            if file_url is not None:
+                updates.append("file_url = %s")
+                params.append(file_url)
+            
+            updates.append("version = COALESCE(version, 1) + 1")
+            updates.append("updated_at = CURRENT_TIMESTAMP")
+            params.append(doc_id)
+            
+            query = f"UPDATE documents SET {', '.join(updates)} WHERE id = %s RETURNING id, title, content, file_url, version, updated_at"
+            
+            cur.execute(query, params)
+            document = dict(cur.fetchone())
+            with conn.cursor() as version_cur:
+                record_version(version_cur, document['id'], previous, document, updated_by)
+            document.pop('content')
+            document.pop('file_url')
+        
+        conn.commit()
+        track_write(conn, headers)
+        cur.close()
     
     if not document:
         return {
@@ -201,7 +497,7 @@ def update_document(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str,
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps({'success': True, 'document': dict(document)}, default=str),
+        'body': dumps({'success': True, 'document': document}),
         'isBase64Encoded': False
     }
 
@@ -217,14 +513,14 @@ def delete_document(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str,
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("UPDATE documents SET status = 'deleted' WHERE id = %s", (doc_id,))
-    affected = cur.rowcount
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        cur.execute("UPDATE documents SET status = 'deleted' WHERE id = %s", (doc_id,))
+        affected = cur.rowcount
+        conn.commit()
+        track_write(conn, headers)
+        cur.close()
     
     if affected == 0:
         return {
@@ -0,0 +1,140 @@
+'''
+Document version history for ASUBT documents function
+Each edit is stored as a zlib-compressed line delta against the previous version,
+with a full snapshot every DOCUMENT_SNAPSHOT_INTERVAL versions, so rebuilding any
+version replays at most that many deltas.
+Delta format (JSON): a list of ops, [start, end] copies lines start:end of the base,
+a string inserts literal text.
+'''
+
+import difflib
+import json
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Union
+
+DOCUMENT_SNAPSHOT_INTERVAL = max(1, int(os.environ.get('DOCUMENT_SNAPSHOT_INTERVAL', '20')))
+COMPRESSION_LEVEL = 6
+
+DeltaOp = Union[List[int], str]
+
+def make_delta(base: str, target: str) -> List[DeltaOp]:
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    ops: List[DeltaOp] = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif tag in ('replace', 'insert'):
+            ops.append(''.join(target_lines[j1:j2]))
+    return ops
+
+def apply_delta(base: str, ops: List[DeltaOp]) -> str:
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+def pack(data: Any) -> bytes:
+    raw = data.encode('utf-8') if isinstance(data, str) else json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return zlib.compress(raw, COMPRESSION_LEVEL)
+
+def unpack(payload: Any) -> str:
+    return zlib.decompress(bytes(payload)).decode('utf-8')
+
+def insert_version(cur, document_id: int, version: int, kind: str, payload: bytes, document: Dict[str, Any], author: Optional[int]) -> None:
+    cur.execute(
+        """
+        INSERT INTO document_versions (document_id, version, kind, payload, title, file_url, content_length, created_by)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        (
+            document_id, version, kind, payload, document.get('title'), document.get('file_url'),
+            len(document.get('content') or ''), author
+        )
+    )
+
+def record_version(cur, document_id: int, previous: Dict[str, Any], current: Dict[str, Any], author: Optional[int]) -> str:
+    '''
+    Store current (a document row with its new version number) on top of previous.
+    Must run in the transaction that holds the document row lock.
+    Documents created before history existed get their previous state written
+    as a baseline snapshot first. Returns the kind of row written.
+    '''
+    cur.execute(
+        """
+        SELECT MAX(version), MAX(version) FILTER (WHERE kind = 'snapshot')
+        FROM document_versions WHERE document_id = %s
+        """,
+        (document_id,)
+    )
+    latest, last_snapshot = cur.fetchone()
+
+    if latest != previous['version']:
+        insert_version(cur, document_id, previous['version'], 'snapshot', pack(previous.get('content') or ''), previous, None)
+        last_snapshot = previous['version']
+
+    content = current.get('content') or ''
+    snapshot = pack(content)
+    kind, payload = 'snapshot', snapshot
+
+    if current['version'] - last_snapshot < DOCUMENT_SNAPSHOT_INTERVAL:
+        delta = pack(make_delta(previous.get('content') or '', content))
+        if len(delta) < len(snapshot):
+            kind, payload = 'delta', delta
+
+    insert_version(cur, document_id, current['version'], kind, payload, current, author)
+    return kind
+
+def list_versions(cur, document_id: int) -> List[tuple]:
+    cur.execute(
+        """
+        SELECT version, kind, title, content_length, octet_length(payload) as stored_bytes, created_by, created_at
+        FROM document_versions
+        WHERE document_id = %s
+        ORDER BY version DESC
+        """,
+        (document_id,)
+    )
+    return cur.fetchall()
+
+def load_version(cur, document_id: int, version: int) -> Optional[Dict[str, Any]]:
+    '''Rebuild one version from the nearest snapshot at or below it.'''
+    cur.execute(
+        """
+        SELECT version, kind, payload, title, file_url, created_by, created_at
+        FROM document_versions
+        WHERE document_id = %(id)s AND version <= %(version)s
+          AND version >= (
+              SELECT MAX(version) FROM document_versions
+              WHERE document_id = %(id)s AND version <= %(version)s AND kind = 'snapshot'
+          )
+        ORDER BY version
+        """,
+        {'id': document_id, 'version': version}
+    )
+    rows = cur.fetchall()
+    if not rows or rows[-1][0] != version:
+        return None
+
+    content = ''
+    for _, kind, payload, *_ in rows:
+        data = unpack(payload)
+        content = data if kind == 'snapshot' else apply_delta(content, json.loads(data))
+
+    _, _, _, title, file_url, created_by, created_at = rows[-1]
+    return {
+        'document_id': document_id,
+        'version': version,
+        'title': title,
+        'file_url': file_url,
+        'content': content,
+        'created_by': created_by,
+        'created_at': str(created_at),
+        'replayed_deltas': len(rows) - 1
+    }
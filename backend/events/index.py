@@ -3,18 +3,68 @@ Backend function for events/activities management in ASUBT system
 Handles: create, read, update, delete events and activities
 '''
 
+import base64
+import hashlib
 import json
-import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from db import db_connection, dict_cursor, read_after_lsn, track_write
+from instrumentation import instrumented
+from responses import get_request_header, with_compression
+from runtime import get_json_body, route
+from serialization import dumps, row_to_dict, rows_to_dicts
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 5000
+EVENT_STATUSES = ('planned', 'in_progress', 'completed', 'overdue')
+MAX_TITLE_LENGTH = 500
+MAX_EVENT_TYPE_LENGTH = 100
+MAX_INT4 = 2 ** 31 - 1
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+def encode_cursor(planned_date: Optional[Any], event_id: int) -> str:
+    sort_date = str(planned_date) if planned_date else 'infinity'
+    raw = json.dumps([sort_date, event_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
 
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    sort_date, event_id = json.loads(raw)
+    if sort_date != 'infinity':
+        datetime.strptime(sort_date, '%Y-%m-%d')
+    return sort_date, int(event_id)
+
+def parse_page_size(value: Optional[str]) -> int:
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+def compute_etag(cur, tables: Tuple[str, ...], params: Dict[str, Any]) -> str:
+    cur.execute(
+        "SELECT table_name, version FROM table_versions WHERE table_name = ANY(%s) ORDER BY table_name",
+        (list(tables),)
+    )
+    versions = [list(row) for row in cur.fetchall()]
+    fingerprint = json.dumps([versions, sorted(params.items())])
+    # Weak: with_compression serves gzip, br and identity bodies under the same tag
+    return 'W/"' + hashlib.sha1(fingerprint.encode()).hexdigest()[:20] + '"'
+
+def etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    '''If-None-Match uses weak comparison, so the W/ prefix is ignored on both sides.'''
+    if_none_match = get_request_header(event, 'If-None-Match')
+    opaque_tag = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') in (opaque_tag, '*') for tag in if_none_match.split(',')) if if_none_match else False
+
+def not_modified(headers: Dict[str, str], etag: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': dict(headers, ETag=etag),
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+@instrumented
+@with_compression
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Manage events and activities in ASUBT system
@@ -22,39 +72,34 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context with request_id, function_name attributes
     Returns: HTTP response with operation result
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'Access-Control-Allow-Origin': '*'
-    }
-    
-    if method == 'GET':
-        return get_events(event, headers)
-    elif method == 'POST':
-        return create_event(event, headers)
-    elif method == 'PUT':
-        return update_event(event, headers)
-    elif method == 'DELETE':
-        return delete_event(event, headers)
-    
+    return route(
+        event,
+        {'GET': get_events, 'POST': create_events, 'PUT': update_events, 'DELETE': delete_event},
+        allow_headers='Content-Type, X-Auth-Token, X-User-Id, If-None-Match, X-Write-LSN',
+        expose_headers='ETag, X-Write-LSN'
+    )
+
+def create_events(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    body_data = get_json_body(event)
+    if not isinstance(body_data, dict):
+        return body_not_object(headers)
+    if 'events' in body_data:
+        return create_events_batch(body_data, headers)
+    return create_event(body_data, headers)
+
+def update_events(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    body_data = get_json_body(event)
+    if not isinstance(body_data, dict):
+        return body_not_object(headers)
+    if 'ids' in body_data:
+        return update_events_batch(body_data, headers)
+    return update_event(body_data, headers)
+
+def body_not_object(headers: Dict[str, str]) -> Dict[str, Any]:
     return {
-        'statusCode': 405,
+        'statusCode': 400,
         'headers': headers,
-        'body': json.dumps({'error': 'Method not allowed'}),
+        'body': json.dumps({'error': 'Request body must be a JSON object'}),
         'isBase64Encoded': False
     }
 
@@ -64,66 +109,98 @@ def get_events(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]
     status = params.get('status')
     event_type = params.get('type')
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        page_size = parse_page_size(params.get('limit'))
+        cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+    except (ValueError, TypeError):
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Invalid cursor or limit'}),
+            'isBase64Encoded': False
+        }
     
-    if event_id:
-        cur.execute(
-            "SELECT e.*, u.full_name as responsible_name FROM events e LEFT JOIN users u ON e.responsible_user_id = u.id WHERE e.id = %s",
-            (event_id,)
-        )
-        evt = cur.fetchone()
-        cur.close()
-        conn.close()
+    with db_connection(readonly=True, min_lsn=read_after_lsn(event)) as conn:
+        cur = conn.cursor()
         
-        if not evt:
+        etag = compute_etag(cur, ('events', 'users'), params)
+        if etag_matches(event, etag):
+            cur.close()
+            return not_modified(headers, etag)
+        etag_headers = dict(headers, ETag=etag)
+        
+        if event_id:
+            cur.execute(
+                "SELECT e.*, u.full_name as responsible_name FROM events e LEFT JOIN users u ON e.responsible_user_id = u.id WHERE e.id = %s",
+                (event_id,)
+            )
+            evt = row_to_dict(cur, cur.fetchone())
+            cur.close()
+            
+            if not evt:
+                return {
+                    'statusCode': 404,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Event not found'}),
+                    'isBase64Encoded': False
+                }
+            
             return {
-                'statusCode': 404,
-                'headers': headers,
-                'body': json.dumps({'error': 'Event not found'}),
+                'statusCode': 200,
+                'headers': etag_headers,
+                'body': dumps({'event': evt}),
                 'isBase64Encoded': False
             }
         
-        return {
-            'statusCode': 200,
-            'headers': headers,
-            'body': json.dumps({'event': dict(evt)}, default=str),
-            'isBase64Encoded': False
-        }
-    
-    query = "SELECT e.*, u.full_name as responsible_name FROM events e LEFT JOIN users u ON e.responsible_user_id = u.id WHERE 1=1"
-    params_list = []
-    
-    if status:
-        query += " AND e.status = %s"
-        params_list.append(status)
-    
-    if event_type:
-        query += " AND e.event_type = %s"
-        params_list.append(event_type)
-    
-    query += " ORDER BY e.planned_date DESC LIMIT 100"
+        query = "SELECT e.*, u.full_name as responsible_name FROM events e LEFT JOIN users u ON e.responsible_user_id = u.id WHERE 1=1"
+        params_list = []
+        
+        if status:
+            query += " AND e.status = %s"
+            params_list.append(status)
+        
+        if event_type:
+            query += " AND e.event_type = %s"
+            params_list.append(event_type)
+        
+        if cursor:
+            query += " AND (COALESCE(e.planned_date, 'infinity'::date), e.id) < (%s::date, %s)"
+            params_list.extend(cursor)
+        
+        query += " ORDER BY COALESCE(e.planned_date, 'infinity'::date) DESC, e.id DESC LIMIT %s"
+        params_list.append(page_size + 1)
+        
+        cur.execute(query, params_list)
+        events = rows_to_dicts(cur, cur.fetchall())
+        cur.close()
     
-    cur.execute(query, params_list)
-    events = cur.fetchall()
-    cur.close()
-    conn.close()
+    next_cursor = None
+    if len(events) > page_size:
+        events = events[:page_size]
+        next_cursor = encode_cursor(events[-1]['planned_date'], events[-1]['id'])
     
     return {
         'statusCode': 200,
-        'headers': headers,
-        'body': json.dumps({'events': [dict(evt) for evt in events]}, default=str),
+        'headers': etag_headers,
+        'body': dumps({'events': events, 'next_cursor': next_cursor}),
         'isBase64Encoded': False
     }
 
-def create_event(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    body_data = json.loads(event.get('body', '{}'))
+def create_event(body_data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    field_error = event_field_error(body_data)
+    if field_error:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': field_error}),
+            'isBase64Encoded': False
+        }
     
-    title = body_data.get('title', '').strip()
+    title = (body_data.get('title') or '').strip()
     description = body_data.get('description', '')
-    event_type = body_data.get('event_type', '').strip()
+    event_type = (body_data.get('event_type') or '').strip()
     responsible_user_id = body_data.get('responsible_user_id')
-    planned_date = body_data.get('planned_date')
+    planned_date = body_data.get('planned_date') or None
     
     if not title or not event_type:
         return {
@@ -133,44 +210,30 @@ def create_event(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, An
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cur.execute(
-        "INSERT INTO events (title, description, event_type, responsible_user_id, planned_date, status) VALUES (%s, %s, %s, %s, %s, 'planned') RETURNING id, title, event_type, status, created_at",
-        (title, description, event_type, responsible_user_id, planned_date)
-    )
-    new_event = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = dict_cursor(conn)
+        
+        cur.execute(
+            "INSERT INTO events (title, description, event_type, responsible_user_id, planned_date, status) VALUES (%s, %s, %s, %s, %s, 'planned') RETURNING id, title, event_type, status, created_at",
+            (title, description, event_type, responsible_user_id, planned_date)
+        )
+        new_event = cur.fetchone()
+        conn.commit()
+        track_write(conn, headers)
+        cur.close()
     
     return {
         'statusCode': 201,
         'headers': headers,
-        'body': json.dumps({'success': True, 'event': dict(new_event)}, default=str),
+        'body': dumps({'success': True, 'event': dict(new_event)}),
         'isBase64Encoded': False
     }
 
-def update_event(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    body_data = json.loads(event.get('body', '{}'))
-    
-    event_id = body_data.get('id')
-    title = body_data.get('title')
-    description = body_data.get('description')
-    status = body_data.get('status')
-    completed_date = body_data.get('completed_date')
-    
-    if not event_id:
-        return {
-            'statusCode': 400,
-            'headers': headers,
-            'body': json.dumps({'error': 'Event ID is required'}),
-            'isBase64Encoded': False
-        }
-    
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+def build_event_updates(data: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    title = data.get('title')
+    description = data.get('description')
+    status = data.get('status')
+    completed_date = data.get('completed_date')
     
     updates = []
     params = []
@@ -189,15 +252,217 @@ def update_event(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, An
         params.append(completed_date)
     
     updates.append("updated_at = CURRENT_TIMESTAMP")
-    params.append(event_id)
+    return updates, params
+
+def validate_date(value: Any) -> bool:
+    if value in (None, ''):
+        return True
+    try:
+        datetime.strptime(str(value), '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+def is_int4_id(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_INT4
+
+def event_field_error(data: Dict[str, Any]) -> Optional[str]:
+    '''
+    Check the type and column limits of every event field present in data,
+    so bad input is reported as a 400 rather than failing in the INSERT/UPDATE.
+    '''
+    for field, max_length in (('title', MAX_TITLE_LENGTH), ('event_type', MAX_EVENT_TYPE_LENGTH)):
+        value = data.get(field)
+        if value is not None and (not isinstance(value, str) or len(value.strip()) > max_length):
+            return f'{field} must be a string of at most {max_length} characters'
+    if data.get('description') is not None and not isinstance(data['description'], str):
+        return 'description must be a string'
+    if data.get('status') and data['status'] not in EVENT_STATUSES:
+        return f'status must be one of {", ".join(EVENT_STATUSES)}'
+    for field in ('planned_date', 'completed_date'):
+        if not validate_date(data.get(field)):
+            return f'{field} must be YYYY-MM-DD'
+    if data.get('responsible_user_id') is not None and not is_int4_id(data['responsible_user_id']):
+        return 'responsible_user_id must be a positive integer'
+    return None
+
+def create_events_batch(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    items = data.get('events')
+    
+    if not isinstance(items, list) or not items or len(items) > MAX_BATCH_SIZE:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'events must be a non-empty array of at most {MAX_BATCH_SIZE} items'}),
+            'isBase64Encoded': False
+        }
+    
+    results: List[Dict[str, Any]] = [{'index': index} for index in range(len(items))]
+    rows = []
+    row_indexes = []
+    responsible_ids = set()
+    
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index]['error'] = 'Item must be an object'
+            continue
+        
+        field_error = event_field_error(item)
+        if field_error:
+            results[index]['error'] = field_error
+            continue
+        
+        title = (item.get('title') or '').strip()
+        event_type = (item.get('event_type') or '').strip()
+        responsible_user_id = item.get('responsible_user_id')
+        planned_date = item.get('planned_date') or None
+        
+        if not title or not event_type:
+            results[index]['error'] = 'Title and event_type are required'
+            continue
+        if responsible_user_id is not None:
+            responsible_ids.add(responsible_user_id)
+        
+        rows.append((title, item.get('description', ''), event_type, responsible_user_id, planned_date))
+        row_indexes.append(index)
+    
+    created = []
+    
+    if rows:
+        with db_connection() as conn:
+            cur = dict_cursor(conn)
+            
+            if responsible_ids:
+                cur.execute("SELECT id FROM users WHERE id = ANY(%s)", (list(responsible_ids),))
+                unknown_ids = responsible_ids - {row['id'] for row in cur.fetchall()}
+                if unknown_ids:
+                    kept = []
+                    for row, index in zip(rows, row_indexes):
+                        if row[3] in unknown_ids:
+                            results[index]['error'] = 'Responsible user not found'
+                        else:
+                            kept.append((row, index))
+                    rows = [row for row, _ in kept]
+                    row_indexes = [index for _, index in kept]
+            
+            if rows:
+                from psycopg2.extras import execute_values
+                created = execute_values(
+                    cur,
+                    "INSERT INTO events (title, description, event_type, responsible_user_id, planned_date, status) VALUES %s RETURNING id, title, event_type, status, created_at",
+                    rows,
+                    template="(%s, %s, %s, %s, %s, 'planned')",
+                    page_size=len(rows),
+                    fetch=True
+                )
+            conn.commit()
+            track_write(conn, headers)
+            cur.close()
+    
+    for index, new_event in zip(row_indexes, created):
+        results[index]['event'] = dict(new_event)
+    
+    errors = sum(1 for result in results if 'error' in result)
+    status_code = 201 if not errors else (207 if created else 400)
+    
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': dumps({
+            'success': errors == 0,
+            'created': len(created),
+            'failed': errors,
+            'results': results
+        }),
+        'isBase64Encoded': False
+    }
+
+def update_events_batch(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    ids = data.get('ids')
+    
+    if isinstance(ids, list) and all(is_int4_id(event_id) for event_id in ids):
+        event_ids = sorted(set(ids))
+    else:
+        event_ids = []
+    
+    if not event_ids or len(event_ids) > MAX_BATCH_SIZE:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'ids must be a non-empty array of at most {MAX_BATCH_SIZE} integers'}),
+            'isBase64Encoded': False
+        }
     
-    query = f"UPDATE events SET {', '.join(updates)} WHERE id = %s RETURNING id, title, status, updated_at"
+    field_error = event_field_error(data)
+    if field_error:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': field_error}),
+            'isBase64Encoded': False
+        }
     
-    cur.execute(query, params)
-    updated_event = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    updates, params = build_event_updates(data)
+    params.append(event_ids)
+    
+    with db_connection() as conn:
+        cur = dict_cursor(conn)
+        cur.execute(
+            f"UPDATE events SET {', '.join(updates)} WHERE id = ANY(%s) RETURNING id, title, status, updated_at",
+            params
+        )
+        updated = rows_to_dicts(cur, cur.fetchall())
+        conn.commit()
+        track_write(conn, headers)
+        cur.close()
+    
+    not_found = sorted(set(event_ids) - {row['id'] for row in updated})
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': dumps({
+            'success': not not_found,
+            'updated': len(updated),
+            'events': updated,
+            'not_found': not_found
+        }),
+        'isBase64Encoded': False
+    }
+
+def update_event(body_data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    event_id = body_data.get('id')
+    
+    if not event_id:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Event ID is required'}),
+            'isBase64Encoded': False
+        }
+    
+    field_error = event_field_error(body_data)
+    if field_error:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': field_error}),
+            'isBase64Encoded': False
+        }
+    
+    updates, params = build_event_updates(body_data)
+    params.append(event_id)
+    
+    with db_connection() as conn:
+        cur = dict_cursor(conn)
+        
+        query = f"UPDATE events SET {', '.join(updates)} WHERE id = %s RETURNING id, title, status, updated_at"
+        
+        cur.execute(query, params)
+        updated_event = cur.fetchone()
+        conn.commit()
+        track_write(conn, headers)
+        cur.close()
     
     if not updated_event:
         return {
@@ -210,7 +475,7 @@ def update_event(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, An
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps({'success': True, 'event': dict(updated_event)}, default=str),
+        'body': dumps({'success': True, 'event': dict(updated_event)}),
         'isBase64Encoded': False
     }
 
@@ -226,14 +491,14 @@ def delete_event(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, An
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("DELETE FROM events WHERE id = %s", (event_id,))
-    affected = cur.rowcount
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        cur.execute("DELETE FROM events WHERE id = %s", (event_id,))
+        affected = cur.rowcount
+        conn.commit()
+        track_write(conn, headers)
+        cur.close()
     
     if affected == 0:
         return {
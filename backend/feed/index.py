@@ -0,0 +1,175 @@
+'''
+Backend function for the change feed in ASUBT system
+Handles: long-poll for changes to events, documents and incidents recorded in change_log
+'''
+
+import os
+import re
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from db import DATABASE_URL, db_connection, is_connection_error
+from instrumentation import instrumented
+from listener import CHANGES_CHANNEL, ChangeListener
+from responses import with_compression
+from runtime import error_response, route
+from serialization import dumps, rows_to_dicts
+
+FEED_TABLES = ('events', 'documents', 'incidents')
+FEED_DEFAULT_WAIT_SECONDS = float(os.environ.get('FEED_DEFAULT_WAIT_SECONDS', '20'))
+FEED_MAX_WAIT_SECONDS = float(os.environ.get('FEED_MAX_WAIT_SECONDS', '25'))
+FEED_RECHECK_SECONDS = float(os.environ.get('FEED_RECHECK_SECONDS', '1'))
+FEED_MAX_CHANGES = int(os.environ.get('FEED_MAX_CHANGES', '500'))
+
+_CURSOR = re.compile(r'^(\d+)-(\d+)$')
+
+# Only transactions older than every running one are returned: seq is assigned at
+# insert but commits land in any order, so a plain seq cursor could skip a change
+# that commits after a later-numbered one. Positions below the snapshot xmin are final.
+CHANGES_QUERY = """
+    SELECT seq, txid::text, table_name, op, row_id, changed_at
+    FROM change_log
+    WHERE (txid, seq) > (%s::xid8, %s)
+      AND txid < pg_snapshot_xmin(pg_current_snapshot())
+      AND table_name = ANY(%s)
+    ORDER BY txid, seq
+    LIMIT %s
+"""
+
+# Committed changes the gate above still withholds: a long-running transaction anywhere
+# in the cluster holds the snapshot xmin back and stalls the feed until it ends.
+# Reported to clients so a stall is visible instead of looking like an idle feed.
+HELD_BACK_QUERY = """
+    SELECT COUNT(*), EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(changed_at))
+    FROM change_log
+    WHERE (txid, seq) > (%s::xid8, %s)
+      AND txid >= pg_snapshot_xmin(pg_current_snapshot())
+      AND table_name = ANY(%s)
+"""
+
+HEAD_QUERY = """
+    SELECT txid::text, seq
+    FROM change_log
+    WHERE txid < pg_snapshot_xmin(pg_current_snapshot())
+    ORDER BY txid DESC, seq DESC
+    LIMIT 1
+"""
+
+listener = ChangeListener(DATABASE_URL, CHANGES_CHANNEL)
+
+def encode_cursor(txid: Any, seq: int) -> str:
+    return f'{txid}-{seq}'
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    match = _CURSOR.match(cursor)
+    if not match:
+        raise ValueError('Invalid cursor')
+    return match.group(1), int(match.group(2))
+
+def parse_tables(value: Optional[str]) -> List[str]:
+    tables = [name.strip() for name in (value or ','.join(FEED_TABLES)).split(',') if name.strip()]
+    if not tables or any(name not in FEED_TABLES for name in tables):
+        raise ValueError(f'tables must be a subset of {", ".join(FEED_TABLES)}')
+    return tables
+
+@instrumented
+@with_compression
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Deliver changes to events, documents and incidents to subscribed clients
+    Args: event with httpMethod, queryStringParameters (cursor, tables, wait)
+          context with request_id, function_name attributes
+    Returns: HTTP response with changes after the cursor and the cursor to resume from
+    '''
+    return route(event, {'GET': get_changes})
+
+def get_changes(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    '''
+    Without a cursor, returns the current head to start from. With one, returns the
+    changes after it, waiting up to `wait` seconds for a notification if there are none.
+    '''
+    params = event.get('queryStringParameters') or {}
+
+    try:
+        tables = parse_tables(params.get('tables'))
+        after = decode_cursor(params['cursor']) if params.get('cursor') else None
+        wait = min(float(params.get('wait') or FEED_DEFAULT_WAIT_SECONDS), FEED_MAX_WAIT_SECONDS)
+        if not wait >= 0:
+            raise ValueError('wait must be a non-negative number of seconds')
+    except ValueError as error:
+        return error_response(400, str(error), headers)
+
+    try:
+        if after is None:
+            return changes_response(read_head(), [], False, (0, None), headers)
+        return poll_changes(after, tables, wait, headers)
+    except Exception as error:
+        if not is_connection_error(error):
+            raise
+        return error_response(503, 'Change feed is temporarily unavailable', dict(headers, **{'Retry-After': '5'}))
+
+def read_head() -> str:
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(HEAD_QUERY)
+        row = cur.fetchone()
+        cur.close()
+    return encode_cursor(*row) if row else encode_cursor(0, 0)
+
+def read_changes(after: Tuple[str, int], tables: List[str]) -> Tuple[List[Dict[str, Any]], Tuple[int, Optional[float]]]:
+    '''Returns the released changes after the cursor and (count, age in seconds) of those held back.'''
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(CHANGES_QUERY, (after[0], after[1], tables, FEED_MAX_CHANGES))
+        changes = rows_to_dicts(cur, cur.fetchall())
+        cur.execute(HELD_BACK_QUERY, (after[0], after[1], tables))
+        held_count, held_seconds = cur.fetchone()
+        cur.close()
+    return changes, (held_count, float(held_seconds) if held_seconds is not None else None)
+
+def poll_changes(after: Tuple[str, int], tables: List[str], wait: float, headers: Dict[str, str]) -> Dict[str, Any]:
+    '''
+    change_log is queried once up front and again only when a notification arrives,
+    so an idle subscriber costs no queries while it waits. The pooled connection is
+    returned before waiting; only the instance's listener connection stays open.
+    '''
+    deadline = time.monotonic() + wait
+    recheck = False
+
+    while True:
+        generation = listener.sync()
+        changes, held_back = read_changes(after, tables)
+        remaining = deadline - time.monotonic()
+
+        if changes or remaining <= 0:
+            break
+
+        # A notified change can stay hidden while an older transaction is still open
+        # (see CHANGES_QUERY), so after an empty wake-up look again soon
+        woke = listener.wait(generation, min(remaining, FEED_RECHECK_SECONDS) if recheck else remaining)
+        recheck = recheck or woke
+
+    cursor = encode_cursor(changes[-1]['txid'], changes[-1]['seq']) if changes else encode_cursor(*after)
+    return changes_response(cursor, changes, len(changes) == FEED_MAX_CHANGES, held_back, headers)
+
+def changes_response(
+    cursor: str,
+    changes: List[Dict[str, Any]],
+    more: bool,
+    held_back: Tuple[int, Optional[float]],
+    headers: Dict[str, str]
+) -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': dict(headers, **{'Cache-Control': 'no-store'}),
+        'body': dumps({
+            'changes': [
+                {'seq': change['seq'], 'table': change['table_name'], 'op': change['op'], 'id': change['row_id'], 'changed_at': change['changed_at']}
+                for change in changes
+            ],
+            'cursor': cursor,
+            'more': more,
+            'held_back': held_back[0],
+            'held_back_seconds': round(held_back[1], 3) if held_back[1] is not None else None
+        }),
+        'isBase64Encoded': False
+    }
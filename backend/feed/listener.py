@@ -0,0 +1,104 @@
+'''
+Change notification listener for ASUBT feed function
+One connection per function instance stays subscribed (LISTEN) to the channel the
+change_log triggers notify on, across warm invocations. Concurrent long-polls share
+it: one request reads the socket while the others wait on a condition, and every
+received notification bumps a generation counter that wakes them all.
+'''
+
+import select
+import threading
+import time
+from typing import Any, Dict, Optional
+from instrumentation import log
+
+CHANGES_CHANNEL = 'asubt_changes'
+
+class ChangeListener:
+    def __init__(self, dsn: Optional[str], channel: str):
+        self.dsn = dsn
+        self.channel = channel
+        self.generation = 0
+        self._conn: Any = None
+        self._reading = False
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {'notifications': 0, 'connects': 0, 'disconnects': 0}
+
+    def sync(self) -> int:
+        '''
+        Consume notifications already queued and return the generation to pass
+        to wait(). Take it before querying change_log so no commit falls between.
+        '''
+        with self._cond:
+            if not self._reading:
+                self._read_locked(0)
+            return self.generation
+
+    def wait(self, generation: int, timeout: float) -> bool:
+        '''Block until a notification newer than generation arrives; False on timeout.'''
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.generation == generation:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if self._reading:
+                    self._cond.wait(remaining)
+                else:
+                    self._read_locked(remaining)
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return dict(self._stats, generation=self.generation, connected=self._conn is not None and not self._conn.closed)
+
+    def _read_locked(self, timeout: float) -> None:
+        '''Called with the lock held; releases it while blocked on the socket.'''
+        self._reading = True
+        self._cond.release()
+        received = 0
+        try:
+            received = self._read(timeout)
+        finally:
+            self._cond.acquire()
+            self._reading = False
+            self.generation += received
+            self._stats['notifications'] += received
+            self._cond.notify_all()
+
+    def _read(self, timeout: float) -> int:
+        import psycopg2
+        conn = self._connection()
+        try:
+            if not conn.notifies and timeout > 0:
+                select.select([conn], [], [], timeout)
+            conn.poll()
+        except psycopg2.Error:
+            # Notifications sent while reconnecting are lost; count the drop as one
+            # so waiters re-read change_log instead of sleeping until their timeout
+            self._disconnect()
+            return 1
+        received = len(conn.notifies)
+        conn.notifies.clear()
+        return received
+
+    def _connection(self) -> Any:
+        if self._conn is None or self._conn.closed:
+            import psycopg2
+            conn = psycopg2.connect(self.dsn)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN {self.channel}')
+            self._conn = conn
+            self._stats['connects'] += 1
+            log('feed.listening', channel=self.channel)
+        return self._conn
+
+    def _disconnect(self) -> None:
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+        self._stats['disconnects'] += 1
+        log('feed.listener_disconnected', channel=self.channel)
@@ -0,0 +1,328 @@
+'''
+Backend function for bulk import of HR records in ASUBT system
+Handles: CSV/XLSX upload of training, PPE and medical examination records
+'''
+
+import base64
+import binascii
+import csv
+import io
+import json
+import os
+from typing import Dict, Any, Iterator, List, Tuple
+from datetime import datetime
+from db import db_connection, track_write
+from instrumentation import instrumented
+from responses import with_compression
+from runtime import error_response, route
+from serialization import dumps
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '5000'))
+MAX_REJECTED_REPORT = int(os.environ.get('MAX_REJECTED_REPORT', '1000'))
+
+# Field spec: (header in the uploaded file, target column, kind, required, default)
+IMPORT_TABLES = {
+    'training': {
+        'fields': [
+            ('user_email', 'user_id', 'email', True, None),
+            ('training_type', 'training_type', 'text', True, None),
+            ('title', 'title', 'text', True, None),
+            ('instructor_email', 'instructor_id', 'email', False, None),
+            ('training_date', 'training_date', 'date', True, None),
+            ('expiry_date', 'expiry_date', 'date', False, None),
+            ('status', 'status', 'text', False, 'scheduled'),
+            ('notes', 'notes', 'text', False, None)
+        ],
+        'key': ['user_id', 'training_type', 'title', 'training_date'],
+        'max_lengths': {'training_type': 100, 'title': 500, 'status': 50}
+    },
+    'ppe': {
+        'fields': [
+            ('user_email', 'user_id', 'email', True, None),
+            ('ppe_type', 'ppe_type', 'text', True, None),
+            ('ppe_name', 'ppe_name', 'text', True, None),
+            ('issue_date', 'issue_date', 'date', True, None),
+            ('expiry_date', 'expiry_date', 'date', False, None),
+            ('quantity', 'quantity', 'int', False, 1),
+            ('status', 'status', 'text', False, 'issued')
+        ],
+        'key': ['user_id', 'ppe_type', 'ppe_name', 'issue_date'],
+        'max_lengths': {'ppe_type': 255, 'ppe_name': 255, 'status': 50}
+    },
+    'medical_examinations': {
+        'fields': [
+            ('user_email', 'user_id', 'email', True, None),
+            ('exam_type', 'exam_type', 'text', True, None),
+            ('exam_date', 'exam_date', 'date', True, None),
+            ('next_exam_date', 'next_exam_date', 'date', False, None),
+            ('result', 'result', 'text', False, None),
+            ('medical_facility', 'medical_facility', 'text', False, None),
+            ('notes', 'notes', 'text', False, None)
+        ],
+        'key': ['user_id', 'exam_type', 'exam_date'],
+        'max_lengths': {'exam_type': 100, 'result': 100, 'medical_facility': 255}
+    }
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y')
+# Excel on Russian Windows saves "CSV" as cp1251
+CSV_ENCODINGS = ('utf-8-sig', 'cp1251')
+INT4_MIN = -2 ** 31
+INT4_MAX = 2 ** 31 - 1
+
+class InvalidUpload(ValueError):
+    '''The uploaded file cannot be decoded or read as the declared format.'''
+
+@instrumented
+@with_compression
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Bulk import training, PPE and medical examination records from CSV/XLSX
+    Args: event with httpMethod, body (file content), queryStringParameters (table, format), isBase64Encoded
+          context with request_id, function_name attributes
+    Returns: HTTP response with import totals and rejected rows report
+    '''
+    return route(event, {'POST': receive_import}, expose_headers='X-Write-LSN', default_method='POST')
+
+def receive_import(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    params = event.get('queryStringParameters') or {}
+    table = params.get('table', '')
+    
+    if table not in IMPORT_TABLES:
+        return error_response(400, f'table must be one of {", ".join(IMPORT_TABLES)}', headers)
+    
+    body = event.get('body') or ''
+    try:
+        payload = base64.b64decode(body) if event.get('isBase64Encoded') else body.encode('utf-8')
+    except (binascii.Error, ValueError):
+        return error_response(400, 'Request body is not valid base64', headers)
+    file_format = params.get('format') or ('xlsx' if payload[:4] == b'PK\x03\x04' else 'csv')
+    
+    if file_format not in ('csv', 'xlsx'):
+        return error_response(400, 'format must be csv or xlsx', headers)
+    
+    try:
+        return import_records(table, file_format, payload, headers)
+    except InvalidUpload as error:
+        return error_response(400, str(error), headers)
+
+def decode_csv(payload: bytes) -> str:
+    for encoding in CSV_ENCODINGS:
+        try:
+            return payload.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise InvalidUpload(f'CSV file must be encoded as {" or ".join(CSV_ENCODINGS)}')
+
+def iter_csv_rows(payload: bytes) -> Iterator[List[Any]]:
+    reader = csv.reader(io.StringIO(decode_csv(payload), newline=''))
+    try:
+        yield from reader
+    except csv.Error as error:
+        raise InvalidUpload(f'Invalid CSV file: {error}')
+
+def iter_xlsx_rows(payload: bytes) -> Iterator[List[Any]]:
+    from openpyxl import load_workbook
+    
+    # openpyxl reports a corrupt workbook with whatever its zip/XML layer raised
+    try:
+        workbook = load_workbook(io.BytesIO(payload), read_only=True, data_only=True)
+    except Exception:
+        raise InvalidUpload('Invalid XLSX file')
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield list(row)
+    except Exception:
+        raise InvalidUpload('Invalid XLSX file')
+    finally:
+        workbook.close()
+
+def iter_chunks(rows: Iterator[List[Any]], size: int) -> Iterator[List[Tuple[int, List[Any]]]]:
+    chunk = []
+    for line, row in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in row):
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def parse_date(value: Any) -> str:
+    if hasattr(value, 'date') and callable(value.date):
+        return value.date().isoformat()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(text)
+
+def parse_int(value: Any) -> int:
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(value)
+    number = int(value)
+    if not INT4_MIN <= number <= INT4_MAX:
+        raise ValueError(value)
+    return number
+
+def parse_row(
+    fields: List[Tuple],
+    max_lengths: Dict[str, int],
+    positions: Dict[str, int],
+    row: List[Any]
+) -> Tuple[Dict[str, Any], List[str]]:
+    record: Dict[str, Any] = {}
+    errors = []
+    
+    for header, column, kind, required, default in fields:
+        position = positions.get(header)
+        raw = row[position] if position is not None and position < len(row) else None
+        value = raw.strip() if isinstance(raw, str) else raw
+        
+        if value in (None, ''):
+            if required:
+                errors.append(f'{header} is required')
+            record[column] = default
+            continue
+        
+        try:
+            if kind == 'date':
+                record[column] = parse_date(value)
+            elif kind == 'int':
+                record[column] = parse_int(value)
+            elif kind == 'email':
+                record[column] = str(value).lower()
+            else:
+                record[column] = str(value)
+        except (TypeError, ValueError):
+            errors.append(f'{header} has invalid value')
+            continue
+        
+        max_length = max_lengths.get(column)
+        if max_length and len(record[column]) > max_length:
+            errors.append(f'{header} is longer than {max_length} characters')
+    
+    return record, errors
+
+def resolve_emails(cur, emails: set) -> Dict[str, int]:
+    if not emails:
+        return {}
+    cur.execute("SELECT email, id FROM users WHERE email = ANY(%s)", (list(emails),))
+    return dict(cur.fetchall())
+
+def csv_field(value: Any) -> Any:
+    return '' if value is None else value
+
+def import_records(table: str, file_format: str, payload: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+    spec = IMPORT_TABLES[table]
+    fields = spec['fields']
+    columns = [field[1] for field in fields]
+    email_columns = [field[1] for field in fields if field[2] == 'email']
+    
+    rows = iter_xlsx_rows(payload) if file_format == 'xlsx' else iter_csv_rows(payload)
+    header_row = next(rows, None) or []
+    positions = {str(name).strip().lower(): index for index, name in enumerate(header_row) if name is not None}
+    missing = [field[0] for field in fields if field[3] and field[0] not in positions]
+    
+    if missing:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Missing required columns', 'columns': missing}),
+            'isBase64Encoded': False
+        }
+    
+    total_rows = 0
+    rejected_count = 0
+    rejected: List[Dict[str, Any]] = []
+    
+    def reject(line: int, errors: List[str]) -> None:
+        nonlocal rejected_count
+        rejected_count += 1
+        if len(rejected) < MAX_REJECTED_REPORT:
+            rejected.append({'line': line, 'errors': errors})
+    
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"CREATE TEMP TABLE import_staging ON COMMIT DROP AS SELECT {', '.join(columns)} FROM {table} WITH NO DATA"
+        )
+        cur.execute("ALTER TABLE import_staging ADD COLUMN source_line INTEGER")
+        
+        for chunk in iter_chunks(rows, IMPORT_CHUNK_SIZE):
+            total_rows += len(chunk)
+            parsed = []
+            emails = set()
+            
+            for line, row in chunk:
+                record, errors = parse_row(fields, spec['max_lengths'], positions, row)
+                if errors:
+                    reject(line, errors)
+                    continue
+                emails.update(record[column] for column in email_columns if record[column])
+                parsed.append((line, record))
+            
+            user_ids = resolve_emails(cur, emails)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            
+            for line, record in parsed:
+                unknown = [record[column] for column in email_columns if record[column] and record[column] not in user_ids]
+                if unknown:
+                    reject(line, [f'Unknown user email: {email}' for email in unknown])
+                    continue
+                for column in email_columns:
+                    record[column] = user_ids.get(record[column])
+                writer.writerow([csv_field(record[column]) for column in columns] + [line])
+            
+            buffer.seek(0)
+            cur.copy_expert(
+                f"COPY import_staging ({', '.join(columns)}, source_line) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        
+        key = spec['key']
+        # Columns absent from the file keep their stored values on conflict
+        updatable = [field[1] for field in fields if field[1] not in key and field[0] in positions]
+        on_conflict = (
+            f"DO UPDATE SET {', '.join(f'{column} = EXCLUDED.{column}' for column in updatable)}"
+            if updatable else 'DO NOTHING'
+        )
+        
+        # Last occurrence of a natural key in the file wins
+        cur.execute(f"""
+            WITH upserted AS (
+                INSERT INTO {table} ({', '.join(columns)})
+                SELECT DISTINCT ON ({', '.join(key)}) {', '.join(columns)}
+                FROM import_staging
+                ORDER BY {', '.join(key)}, source_line DESC
+                ON CONFLICT ({', '.join(key)}) {on_conflict}
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+        """)
+        inserted, updated = cur.fetchone()
+        conn.commit()
+        track_write(conn, headers)
+        cur.close()
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': dumps({
+            'success': True,
+            'table': table,
+            'total_rows': total_rows,
+            'inserted': inserted,
+            'updated': updated,
+            'rejected': rejected_count,
+            'rejected_rows': rejected,
+            'rejected_truncated': rejected_count > len(rejected)
+        }),
+        'isBase64Encoded': False
+    }
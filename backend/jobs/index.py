@@ -0,0 +1,269 @@
+'''
+Backend function for scheduled maintenance jobs in ASUBT system
+Handles: expiry reminders for training, PPE, medical examinations and SOUT,
+         transition of overdue events, pruning of the change feed log
+'''
+
+import hmac
+import json
+import os
+from typing import Dict, Any, Callable
+from datetime import datetime
+from db import db_connection
+from instrumentation import current_trace, instrumented, log
+from responses import get_request_header, with_compression
+from runtime import error_response, route
+from serialization import dumps
+
+DEFAULT_EXPIRY_DAYS = int(os.environ.get('EXPIRY_REMINDER_DAYS', '30'))
+MAX_EXPIRY_DAYS = 365
+OVERDUE_BATCH_SIZE = int(os.environ.get('OVERDUE_BATCH_SIZE', '10000'))
+CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', '7'))
+CHANGE_LOG_PRUNE_BATCH_SIZE = int(os.environ.get('CHANGE_LOG_PRUNE_BATCH_SIZE', '10000'))
+# Shared secret for manual HTTP runs; without it only the timer trigger can run jobs
+JOBS_TOKEN = os.environ.get('JOBS_TOKEN', '')
+JOBS_TOKEN_HEADER = 'X-Jobs-Token'
+
+# One row per record whose deadline falls inside the window; dedup_key makes reruns idempotent
+EXPIRY_DUE_QUERY = """
+    SELECT 'training' as source, t.user_id, t.expiry_date as due_date,
+           'training:' || t.id || ':' || t.expiry_date as dedup_key,
+           'Истекает срок обучения' as title,
+           'Срок действия обучения «' || t.title || '» истекает ' || TO_CHAR(t.expiry_date, 'DD.MM.YYYY') as message
+    FROM training t
+    WHERE t.expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + %(days)s AND t.user_id IS NOT NULL
+    UNION ALL
+    SELECT 'ppe', p.user_id, p.expiry_date,
+           'ppe:' || p.id || ':' || p.expiry_date,
+           'Истекает срок носки СИЗ',
+           'Срок носки «' || p.ppe_name || '» истекает ' || TO_CHAR(p.expiry_date, 'DD.MM.YYYY')
+    FROM ppe p
+    WHERE p.expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + %(days)s AND p.user_id IS NOT NULL
+    UNION ALL
+    SELECT 'medical', m.user_id, m.next_exam_date,
+           'medical:' || m.id || ':' || m.next_exam_date,
+           'Приближается медицинский осмотр',
+           'Следующий медосмотр («' || m.exam_type || '») необходимо пройти до ' || TO_CHAR(m.next_exam_date, 'DD.MM.YYYY')
+    FROM medical_examinations m
+    WHERE m.next_exam_date BETWEEN CURRENT_DATE AND CURRENT_DATE + %(days)s AND m.user_id IS NOT NULL
+    UNION ALL
+    SELECT 'sout', w.responsible_user_id, w.next_assessment_date,
+           'sout:' || w.id || ':' || w.next_assessment_date,
+           'Приближается срок СОУТ',
+           'Очередная специальная оценка рабочего места «' || w.workplace || '» до ' || TO_CHAR(w.next_assessment_date, 'DD.MM.YYYY')
+    FROM work_conditions_assessment w
+    WHERE w.next_assessment_date BETWEEN CURRENT_DATE AND CURRENT_DATE + %(days)s AND w.responsible_user_id IS NOT NULL
+"""
+
+@instrumented
+@with_compression
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Run scheduled sweeps (timer trigger or manual HTTP call)
+    Args: event with httpMethod, queryStringParameters and headers (X-Jobs-Token), or a timer trigger payload
+          context with request_id, function_name attributes
+    Returns: HTTP response with sweep totals
+    '''
+    return route(
+        event,
+        {'GET': run_job, 'POST': run_job},
+        allow_headers=f'Content-Type, {JOBS_TOKEN_HEADER}',
+        default_method='POST'
+    )
+
+def is_authorized(event: Dict[str, Any]) -> bool:
+    '''Timer trigger invocations carry no httpMethod; HTTP calls must present JOBS_TOKEN.'''
+    if not event.get('httpMethod'):
+        return True
+    token = get_request_header(event, JOBS_TOKEN_HEADER)
+    return bool(JOBS_TOKEN) and hmac.compare_digest(token.encode(), JOBS_TOKEN.encode())
+
+def run_job(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    try:
+        params = get_job_params(event)
+    except ValueError as error:
+        return error_response(400, str(error), headers)
+    
+    job = JOBS.get(params.get('job', ''))
+    
+    if not job:
+        return error_response(400, f'job must be one of {", ".join(JOBS)}', headers)
+    
+    if not is_authorized(event):
+        return error_response(401, f'{JOBS_TOKEN_HEADER} header is missing or invalid', headers)
+    
+    try:
+        result = job(params)
+    except ValueError as error:
+        return error_response(400, str(error), headers)
+    
+    trace = current_trace()
+    log('jobs.completed', request_id=trace.request_id if trace else None, **result)
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': dumps({'success': True, **result}),
+        'isBase64Encoded': False
+    }
+
+def get_job_params(event: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Timer triggers deliver their payload inside messages[].details.payload,
+    HTTP calls use the query string and an optional JSON body.
+    '''
+    params: Dict[str, Any] = {}
+    
+    for message in event.get('messages') or []:
+        payload = (message.get('details') or {}).get('payload')
+        if payload:
+            params.update(parse_job_object(payload, 'Timer payload'))
+    
+    if event.get('body'):
+        params.update(parse_job_object(event['body'], 'Request body'))
+    
+    params.update(event.get('queryStringParameters') or {})
+    return params
+
+def parse_job_object(raw: str, source: str) -> Dict[str, Any]:
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        value = None
+    if not isinstance(value, dict):
+        raise ValueError(f'{source} must be a JSON object')
+    return value
+
+def run_expiry_sweep(params: Dict[str, Any]) -> Dict[str, Any]:
+    days = int(params.get('days') or DEFAULT_EXPIRY_DAYS)
+    
+    if not 0 <= days <= MAX_EXPIRY_DAYS:
+        raise ValueError(f'days must be between 0 and {MAX_EXPIRY_DAYS}')
+    
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            WITH due AS ({EXPIRY_DUE_QUERY}),
+            inserted AS (
+                INSERT INTO notifications (user_id, title, message, type, dedup_key)
+                SELECT user_id, title, message, 'warning', dedup_key FROM due
+                ON CONFLICT (dedup_key) WHERE dedup_key IS NOT NULL DO NOTHING
+                RETURNING dedup_key
+            )
+            SELECT due.source, COUNT(*), COUNT(inserted.dedup_key)
+            FROM due
+            LEFT JOIN inserted ON inserted.dedup_key = due.dedup_key
+            GROUP BY due.source
+            """,
+            {'days': days}
+        )
+        per_source = {source: {'due': due, 'notified': notified} for source, due, notified in cur.fetchall()}
+        conn.commit()
+        cur.close()
+    
+    return {
+        'job': 'expiry',
+        'days': days,
+        'ran_at': datetime.now().isoformat(),
+        'sources': per_source,
+        'notified': sum(counts['notified'] for counts in per_source.values())
+    }
+
+def run_overdue_sweep(params: Dict[str, Any]) -> Dict[str, Any]:
+    batch_size = int(params.get('batch_size') or OVERDUE_BATCH_SIZE)
+    
+    if batch_size < 1:
+        raise ValueError('batch_size must be positive')
+    
+    transitioned = 0
+    notified = 0
+    
+    # Each batch is one statement over the partial index, committed on its own so locks stay short
+    with db_connection() as conn:
+        cur = conn.cursor()
+        while True:
+            cur.execute(
+                """
+                WITH moved AS (
+                    UPDATE events
+                    SET status = 'overdue', updated_at = CURRENT_TIMESTAMP
+                    WHERE id IN (
+                        SELECT id FROM events
+                        WHERE status IN ('planned', 'in_progress') AND planned_date < CURRENT_DATE
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, title, planned_date, responsible_user_id
+                ),
+                inserted AS (
+                    INSERT INTO notifications (user_id, title, message, type, dedup_key)
+                    SELECT responsible_user_id, 'Мероприятие просрочено',
+                           'Мероприятие «' || title || '» не выполнено в срок (' || TO_CHAR(planned_date, 'DD.MM.YYYY') || ')',
+                           'warning', 'overdue:' || id || ':' || planned_date
+                    FROM moved
+                    WHERE responsible_user_id IS NOT NULL
+                    ON CONFLICT (dedup_key) WHERE dedup_key IS NOT NULL DO NOTHING
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM moved), (SELECT COUNT(*) FROM inserted)
+                """,
+                (batch_size,)
+            )
+            moved_count, inserted_count = cur.fetchone()
+            conn.commit()
+            transitioned += moved_count
+            notified += inserted_count
+            if moved_count < batch_size:
+                break
+        cur.close()
+    
+    return {
+        'job': 'overdue',
+        'ran_at': datetime.now().isoformat(),
+        'transitioned': transitioned,
+        'notified': notified
+    }
+
+def run_change_log_prune(params: Dict[str, Any]) -> Dict[str, Any]:
+    days = int(params.get('days') or CHANGE_LOG_RETENTION_DAYS)
+    
+    if days < 1:
+        raise ValueError('days must be positive')
+    
+    pruned = 0
+    
+    # Feed subscribers resume from recent positions only, older entries are deleted in batches
+    with db_connection() as conn:
+        cur = conn.cursor()
+        while True:
+            cur.execute(
+                """
+                DELETE FROM change_log
+                WHERE seq IN (
+                    SELECT seq FROM change_log
+                    WHERE changed_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                    LIMIT %s
+                )
+                """,
+                (days, CHANGE_LOG_PRUNE_BATCH_SIZE)
+            )
+            deleted = cur.rowcount
+            conn.commit()
+            pruned += deleted
+            if deleted < CHANGE_LOG_PRUNE_BATCH_SIZE:
+                break
+        cur.close()
+    
+    return {
+        'job': 'changelog',
+        'ran_at': datetime.now().isoformat(),
+        'retention_days': days,
+        'pruned': pruned
+    }
+
+JOBS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    'expiry': run_expiry_sweep,
+    'overdue': run_overdue_sweep,
+    'changelog': run_change_log_prune
+}
@@ -0,0 +1,105 @@
+'''
+HTTP response helpers for ASUBT backend functions
+Negotiates gzip/brotli compression of large text bodies with the client.
+Each function directory ships an identical copy of this module.
+'''
+
+import base64
+import functools
+import gzip
+import os
+from typing import Any, Callable, Dict, Optional
+from instrumentation import timed
+
+COMPRESSION_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', '5'))
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+_brotli: Any = None
+
+def get_brotli() -> Optional[Any]:
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli or None
+
+def get_request_header(event: Dict[str, Any], name: str) -> str:
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value or ''
+    return ''
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    accepted = {}
+    for part in value.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get('*', 0.0)
+    candidates = ['br', 'gzip'] if get_brotli() else ['gzip']
+    best = None
+    best_quality = 0.0
+    for coding in candidates:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    headers = response.get('headers') or {}
+    content_type = headers.get('Content-Type', '')
+
+    if response.get('isBase64Encoded') or not isinstance(body, str) or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return response
+
+    raw = body.encode('utf-8')
+    if len(raw) < COMPRESSION_MIN_BYTES:
+        return response
+
+    vary_headers = dict(headers, Vary='Accept-Encoding')
+    encoding = choose_encoding(get_request_header(event, 'Accept-Encoding'))
+    if not encoding:
+        return dict(response, headers=vary_headers)
+
+    with timed('compress'):
+        if encoding == 'br':
+            compressed = get_brotli().compress(raw, quality=BROTLI_QUALITY)
+        else:
+            compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+
+    if len(compressed) >= len(raw):
+        return dict(response, headers=vary_headers)
+
+    return dict(
+        response,
+        headers=dict(vary_headers, **{'Content-Encoding': encoding}),
+        body=base64.b64encode(compressed).decode('ascii'),
+        isBase64Encoded=True
+    )
+
+def with_compression(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        return compress_response(event, handler(event, context))
+    return wrapper
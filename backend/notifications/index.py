@@ -0,0 +1,180 @@
+'''
+Backend function for user notifications in ASUBT system
+Handles: notification inbox, unread badge count, marking notifications as read
+'''
+
+import base64
+import hashlib
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
+from db import db_connection
+from instrumentation import instrumented
+from responses import get_request_header, with_compression
+from runtime import error_response, get_json_body, json_response, route
+from serialization import dumps, rows_to_dicts
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_MARK_IDS = 500
+
+# Session check and badge count in one round trip; the count is kept by triggers
+# in notification_unread_counts, so it costs the same for any history length
+SESSION_UNREAD_QUERY = """
+    SELECT s.user_id, COALESCE(c.unread, 0)
+    FROM sessions s
+    JOIN users u ON s.user_id = u.id
+    LEFT JOIN notification_unread_counts c ON c.user_id = s.user_id
+    WHERE s.token_hash = %s AND s.revoked_at IS NULL AND s.expires_at > CURRENT_TIMESTAMP AND u.is_active = true
+"""
+
+def encode_cursor(created_at: str, notification_id: int) -> str:
+    raw = json.dumps([str(created_at), notification_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    created_at, notification_id = json.loads(raw)
+    datetime.fromisoformat(created_at)
+    return created_at, int(notification_id)
+
+def parse_page_size(value: Optional[str]) -> int:
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+def parse_mark_ids(value: Any) -> List[int]:
+    if not isinstance(value, list) or not value or len(value) > MAX_MARK_IDS:
+        raise ValueError(f'ids must list 1 to {MAX_MARK_IDS} notifications')
+    return list(dict.fromkeys(int(item) for item in value))
+
+def authenticate(cur, token: str) -> Optional[Tuple[int, int]]:
+    '''(user_id, unread_count) for the X-Auth-Token session, or None.'''
+    cur.execute(SESSION_UNREAD_QUERY, (hashlib.sha256(token.encode()).hexdigest(),))
+    return cur.fetchone()
+
+@instrumented
+@with_compression
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Read and acknowledge notifications of the signed-in user
+    Args: event with httpMethod, body, queryStringParameters, headers (X-Auth-Token)
+          context with request_id, function_name attributes
+    Returns: HTTP response with inbox page, unread count or marking result
+    '''
+    return route(
+        event,
+        {'GET': get_notifications, 'PUT': mark_read},
+        allow_headers='Content-Type, X-Auth-Token'
+    )
+
+def get_notifications(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    params = event.get('queryStringParameters') or {}
+    unread_only = params.get('unread') in ('1', 'true')
+
+    try:
+        page_size = parse_page_size(params.get('limit'))
+        cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+    except (ValueError, TypeError):
+        return error_response(400, 'Invalid cursor or limit', headers)
+
+    token = get_request_header(event, 'X-Auth-Token')
+    if not token:
+        return error_response(401, 'Authentication required', headers)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        session = authenticate(cur, token)
+
+        if not session:
+            cur.close()
+            return error_response(401, 'Invalid or expired token', headers)
+
+        user_id, unread_count = session
+
+        if 'count' in params:
+            cur.close()
+            return json_response(200, {'unread_count': unread_count}, headers)
+
+        # Served by idx_notifications_inbox, or idx_notifications_unread for unread=1
+        query = "SELECT id, title, message, type, is_read, created_at FROM notifications WHERE user_id = %s"
+        query_params: List[Any] = [user_id]
+
+        if unread_only:
+            query += " AND NOT is_read"
+
+        if cursor:
+            query += " AND (created_at, id) < (%s::timestamp, %s)"
+            query_params.extend(cursor)
+
+        query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+        query_params.append(page_size + 1)
+
+        cur.execute(query, query_params)
+        notifications = rows_to_dicts(cur, cur.fetchall())
+        cur.close()
+
+    next_cursor = None
+    if len(notifications) > page_size:
+        notifications = notifications[:page_size]
+        next_cursor = encode_cursor(notifications[-1]['created_at'], notifications[-1]['id'])
+
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': dumps({'notifications': notifications, 'next_cursor': next_cursor, 'unread_count': unread_count}),
+        'isBase64Encoded': False
+    }
+
+def mark_read(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    '''
+    {"ids": [...]} marks the listed notifications, {"all": true} every unread one.
+    "max_id" with "all" leaves notifications that arrived after the inbox was loaded.
+    '''
+    body_data = get_json_body(event)
+    if not isinstance(body_data, dict):
+        return error_response(400, 'Request body must be an object', headers)
+
+    ids: Optional[List[int]] = None
+    max_id: Optional[int] = None
+
+    try:
+        if body_data.get('all'):
+            max_id = int(body_data['max_id']) if body_data.get('max_id') is not None else None
+        else:
+            ids = parse_mark_ids(body_data.get('ids'))
+    except (ValueError, TypeError):
+        return error_response(400, f'Pass "all": true or "ids" with 1 to {MAX_MARK_IDS} integer ids', headers)
+
+    token = get_request_header(event, 'X-Auth-Token')
+    if not token:
+        return error_response(401, 'Authentication required', headers)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        session = authenticate(cur, token)
+
+        if not session:
+            cur.close()
+            return error_response(401, 'Invalid or expired token', headers)
+
+        user_id = session[0]
+        query = "UPDATE notifications SET is_read = true WHERE user_id = %s AND NOT is_read"
+        query_params: List[Any] = [user_id]
+
+        if ids is not None:
+            query += " AND id = ANY(%s)"
+            query_params.append(ids)
+        elif max_id is not None:
+            query += " AND id <= %s"
+            query_params.append(max_id)
+
+        cur.execute(query, query_params)
+        marked = cur.rowcount
+
+        cur.execute("SELECT unread FROM notification_unread_counts WHERE user_id = %s", (user_id,))
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+
+    return json_response(200, {'success': True, 'marked': marked, 'unread_count': row[0] if row else 0}, headers)
@@ -0,0 +1,77 @@
+'''
+Request runtime for ASUBT backend functions
+CORS preflight, method dispatch and the JSON response envelope shared by every handler.
+Only standard-library imports, so preflights and requests rejected by validation are
+answered without loading the database driver (db.py imports psycopg2 on first use).
+Each function directory ships an identical copy of this module.
+'''
+
+import json
+from typing import Any, Callable, Dict, Mapping, Optional
+
+Route = Callable[[Dict[str, Any], Dict[str, str]], Dict[str, Any]]
+
+DEFAULT_ALLOW_HEADERS = 'Content-Type, X-Auth-Token, X-User-Id, X-Write-LSN'
+
+def preflight_response(methods: str, allow_headers: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': allow_headers,
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+def json_headers(expose_headers: Optional[str] = None) -> Dict[str, str]:
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    if expose_headers:
+        headers['Access-Control-Expose-Headers'] = expose_headers
+    return headers
+
+def json_response(status: int, body: Any, headers: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': headers,
+        'body': body if isinstance(body, str) else json.dumps(body, ensure_ascii=False, default=str),
+        'isBase64Encoded': False
+    }
+
+def error_response(status: int, message: str, headers: Dict[str, str], **extra: Any) -> Dict[str, Any]:
+    return json_response(status, {'error': message, **extra}, headers)
+
+def get_json_body(event: Dict[str, Any]) -> Any:
+    return json.loads(event.get('body') or '{}')
+
+def route(
+    event: Dict[str, Any],
+    routes: Mapping[str, Route],
+    allow_headers: str = DEFAULT_ALLOW_HEADERS,
+    expose_headers: Optional[str] = None,
+    default_method: str = 'GET'
+) -> Dict[str, Any]:
+    '''
+    Answer OPTIONS from the route table, otherwise call routes[method](event, headers).
+    A malformed JSON body is reported as 400 instead of surfacing as a 500.
+    '''
+    method = event.get('httpMethod') or default_method
+
+    if method == 'OPTIONS':
+        return preflight_response(', '.join(list(routes) + ['OPTIONS']), allow_headers)
+
+    headers = json_headers(expose_headers)
+    target = routes.get(method)
+
+    if target is None:
+        return error_response(405, 'Method not allowed', headers)
+
+    try:
+        return target(event, headers)
+    except json.JSONDecodeError:
+        return error_response(400, 'Request body must be valid JSON', headers)
@@ -0,0 +1,59 @@
+'''
+JSON serialization for ASUBT backend functions
+Encodes rows straight from cursor tuples using per-column converters picked
+from the PostgreSQL type OIDs, so dates and numerics never go through a
+json default callback. Uses orjson when it is installed.
+Each function directory ships an identical copy of this module.
+'''
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from instrumentation import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# date, time, timestamp, timestamptz, interval, numeric, timetz
+STRING_TYPE_OIDS = frozenset((1082, 1083, 1114, 1184, 1186, 1700, 1266))
+
+def column_converters(description: Sequence[Any]) -> List[Optional[Callable[[Any], Any]]]:
+    return [str if column[1] in STRING_TYPE_OIDS else None for column in description]
+
+def rows_to_dicts(cur, rows: Sequence[Any]) -> List[Dict[str, Any]]:
+    '''
+    Build JSON-ready dicts from fetched rows (tuples or RealDictRow) using cur.description.
+    Values keep the str() form the handlers used to produce via default=str.
+    '''
+    if not rows:
+        return []
+    with timed('convert'):
+        return _convert_rows(cur.description, rows)
+
+def _convert_rows(description: Sequence[Any], rows: Sequence[Any]) -> List[Dict[str, Any]]:
+    names = [column[0] for column in description]
+    converters = column_converters(description)
+    convert_at = [index for index, converter in enumerate(converters) if converter]
+    result = []
+    for row in rows:
+        values = list(row.values()) if isinstance(row, dict) else list(row)
+        for index in convert_at:
+            if values[index] is not None:
+                values[index] = converters[index](values[index])
+        result.append(dict(zip(names, values)))
+    return result
+
+def row_to_dict(cur, row: Any) -> Optional[Dict[str, Any]]:
+    return rows_to_dicts(cur, [row])[0] if row is not None else None
+
+if orjson is not None:
+    def _encode(data: Any) -> str:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME).decode('utf-8')
+else:
+    def _encode(data: Any) -> str:
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+def dumps(data: Any) -> str:
+    with timed('serialize'):
+        return _encode(data)
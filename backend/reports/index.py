@@ -3,18 +3,72 @@ Backend function for reports generation and export in ASUBT system
 Handles: PDF and Excel report generation for documents, events, incidents
 '''
 
+import base64
+import contextvars
+import csv
+import io
 import json
 import os
-from typing import Dict, Any, List
-from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+from datetime import date, datetime
+from db import db_connection, dict_cursor, read_after_lsn
+from instrumentation import current_trace, instrumented, log
+from responses import with_compression
+from runtime import error_response, route
+from serialization import column_converters, dumps, rows_to_dicts
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '2000'))
+EXPORT_MAX_ROWS = int(os.environ.get('EXPORT_MAX_ROWS', '50000'))
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+# Dashboard sections run in parallel, one pooled connection each, so keep workers <= DB_POOL_MAX_SIZE
+DASHBOARD_SECTIONS = ('summary', 'incidents', 'training', 'sout')
+DASHBOARD_WORKERS = int(os.environ.get('DASHBOARD_WORKERS', '4'))
+DASHBOARD_TIMEOUT_MS = int(os.environ.get('DASHBOARD_TIMEOUT_MS', '3000'))
+DASHBOARD_MAX_TIMEOUT_MS = 25000
 
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8'
+}
+
+# Each export query selects the output columns followed by the keyset (sort key, id)
+# used to continue the export in the next part.
+EXPORT_QUERIES = {
+    'documents': {
+        'columns': ['id', 'title', 'doc_type', 'created_at', 'status', 'creator_name'],
+        'query': """
+            SELECT d.id, d.title, d.doc_type, d.created_at, d.status,
+                   u.full_name as creator_name, COALESCE(d.created_at, 'infinity'::timestamp)::text
+            FROM documents d
+            LEFT JOIN users u ON d.created_by = u.id
+            WHERE d.status = 'active' {after}
+            ORDER BY COALESCE(d.created_at, 'infinity'::timestamp) DESC, d.id DESC
+            LIMIT %s
+        """,
+        'after': "AND (COALESCE(d.created_at, 'infinity'::timestamp), d.id) < (%s::timestamp, %s)",
+        'parse_sort_key': datetime.fromisoformat
+    },
+    'events': {
+        'columns': ['id', 'title', 'event_type', 'status', 'planned_date', 'completed_date', 'responsible_name'],
+        'query': """
+            SELECT e.id, e.title, e.event_type, e.status, e.planned_date,
+                   e.completed_date, u.full_name as responsible_name,
+                   COALESCE(e.planned_date, 'infinity'::date)::text
+            FROM events e
+            LEFT JOIN users u ON e.responsible_user_id = u.id
+            WHERE true {after}
+            ORDER BY COALESCE(e.planned_date, 'infinity'::date) DESC, e.id DESC
+            LIMIT %s
+        """,
+        'after': "AND (COALESCE(e.planned_date, 'infinity'::date), e.id) < (%s::date, %s)",
+        'parse_sort_key': date.fromisoformat
+    }
+}
+
+@instrumented
+@with_compression
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Generate and export reports in various formats
@@ -22,210 +76,416 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context with request_id, function_name attributes
     Returns: HTTP response with report data
     '''
-    method: str = event.get('httpMethod', 'GET')
+    return route(event, {'GET': get_report_data, 'POST': generate_report})
+
+def get_report_data(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    params = event.get('queryStringParameters') or {}
+    report_type = params.get('type', 'summary')
+    export_format = params.get('format')
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    min_lsn = read_after_lsn(event)
     
-    headers = {
-        'Content-Type': 'application/json',
-        'Access-Control-Allow-Origin': '*'
-    }
+    if export_format in EXPORT_CONTENT_TYPES and report_type in EXPORT_QUERIES:
+        return export_report(report_type, export_format, params.get('cursor'), min_lsn, headers)
     
-    if method == 'GET':
-        return get_report_data(event, headers)
-    elif method == 'POST':
-        return generate_report(event, headers)
+    if report_type == 'dashboard':
+        return get_dashboard(params, min_lsn, headers)
+    
+    section = REPORT_SECTIONS.get(report_type)
+    report_data: Dict[str, Any] = {}
+    
+    if section:
+        key, fetch = section
+        with db_connection(readonly=True, min_lsn=min_lsn) as conn:
+            cur = conn.cursor()
+            report_data = {
+                'type': report_type,
+                'generated_at': datetime.now().isoformat(),
+                key: fetch(cur)
+            }
+            cur.close()
     
     return {
-        'statusCode': 405,
+        'statusCode': 200,
         'headers': headers,
-        'body': json.dumps({'error': 'Method not allowed'}),
+        'body': dumps(report_data),
         'isBase64Encoded': False
     }
 
-def get_report_data(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    params = event.get('queryStringParameters') or {}
-    report_type = params.get('type', 'summary')
+def fetch_summary(cur) -> Dict[str, Any]:
+    cur.execute("SELECT name, value FROM summary_counters")
+    counters = dict(cur.fetchall())
+    return {
+        'total_users': counters.get('active_users', 0),
+        'total_documents': counters.get('active_documents', 0),
+        'pending_events': counters.get('pending_events', 0),
+        'active_incidents': counters.get('active_incidents', 0)
+    }
+
+def fetch_documents(cur) -> List[Dict[str, Any]]:
+    cur.execute("""
+        SELECT d.id, d.title, d.doc_type, d.created_at, d.status, 
+               u.full_name as creator_name
+        FROM documents d
+        LEFT JOIN users u ON d.created_by = u.id
+        WHERE d.status = 'active'
+        ORDER BY d.created_at DESC
+    """)
+    return rows_to_dicts(cur, cur.fetchall())
+
+def fetch_events(cur) -> List[Dict[str, Any]]:
+    cur.execute("""
+        SELECT e.id, e.title, e.event_type, e.status, e.planned_date, 
+               e.completed_date, u.full_name as responsible_name
+        FROM events e
+        LEFT JOIN users u ON e.responsible_user_id = u.id
+        ORDER BY e.planned_date DESC
+    """)
+    return rows_to_dicts(cur, cur.fetchall())
+
+def fetch_training(cur) -> List[Dict[str, Any]]:
+    cur.execute("""
+        SELECT t.id, t.training_type, t.title, t.training_date, t.expiry_date,
+               t.status, u.full_name as user_name, i.full_name as instructor_name
+        FROM training t
+        LEFT JOIN users u ON t.user_id = u.id
+        LEFT JOIN users i ON t.instructor_id = i.id
+        ORDER BY t.training_date DESC
+        LIMIT 100
+    """)
+    return rows_to_dicts(cur, cur.fetchall())
+
+def fetch_incidents(cur) -> List[Dict[str, Any]]:
+    cur.execute("""
+        SELECT i.id, i.incident_date, i.location, i.description, i.severity,
+               i.investigation_status, u.full_name as injured_name
+        FROM incidents i
+        LEFT JOIN users u ON i.injured_user_id = u.id
+        ORDER BY i.incident_date DESC
+        LIMIT 100
+    """)
+    return rows_to_dicts(cur, cur.fetchall())
+
+def fetch_sout(cur) -> List[Dict[str, Any]]:
+    cur.execute("""
+        SELECT w.id, w.workplace, w.assessment_date, w.class_conditions,
+               w.subclass_conditions, w.next_assessment_date, u.full_name as responsible_name
+        FROM work_conditions_assessment w
+        LEFT JOIN users u ON w.responsible_user_id = u.id
+        ORDER BY w.assessment_date DESC
+        LIMIT 100
+    """)
+    return rows_to_dicts(cur, cur.fetchall())
+
+# report type -> (response key, fetcher); each fetcher is one independent read
+REPORT_SECTIONS: Dict[str, Tuple[str, Callable[[Any], Any]]] = {
+    'summary': ('statistics', fetch_summary),
+    'documents': ('documents', fetch_documents),
+    'events': ('events', fetch_events),
+    'training': ('training', fetch_training),
+    'incidents': ('incidents', fetch_incidents),
+    'sout': ('assessments', fetch_sout)
+}
+
+_dashboard_executor: Optional[ThreadPoolExecutor] = None
+
+def get_dashboard_executor() -> ThreadPoolExecutor:
+    global _dashboard_executor
+    if _dashboard_executor is None:
+        _dashboard_executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+    return _dashboard_executor
+
+def run_section(name: str, deadline: float, min_lsn: Optional[str]) -> Tuple[Any, float]:
+    '''
+    Fetch one section on its own pooled connection. statement_timeout is set to
+    the time left, so a slow query is cancelled server-side and frees its connection.
+    '''
+    started = time.monotonic()
+    remaining_ms = int((deadline - started) * 1000)
+    if remaining_ms <= 0:
+        raise TimeoutError('deadline passed before the query started')
+    with db_connection(readonly=True, min_lsn=min_lsn) as conn:
+        cur = conn.cursor()
+        cur.execute("SET LOCAL statement_timeout = %s", (remaining_ms,))
+        data = REPORT_SECTIONS[name][1](cur)
+        cur.close()
+    return data, (time.monotonic() - started) * 1000
+
+def get_dashboard(params: Dict[str, Any], min_lsn: Optional[str], headers: Dict[str, str]) -> Dict[str, Any]:
+    names = [name.strip() for name in (params.get('sections') or ','.join(DASHBOARD_SECTIONS)).split(',') if name.strip()]
+    unknown = [name for name in names if name not in REPORT_SECTIONS]
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        timeout_ms = min(int(params.get('timeout_ms') or DASHBOARD_TIMEOUT_MS), DASHBOARD_MAX_TIMEOUT_MS)
+    except ValueError:
+        timeout_ms = -1
     
-    report_data = {}
+    if unknown or not names or timeout_ms <= 0:
+        return error_response(400, f'sections must be a subset of {", ".join(REPORT_SECTIONS)} and timeout_ms a positive integer', headers)
     
-    if report_type == 'summary':
-        cur.execute("SELECT COUNT(*) as total FROM users WHERE is_active = true")
-        users_count = cur.fetchone()
-        
-        cur.execute("SELECT COUNT(*) as total FROM documents WHERE status = 'active'")
-        docs_count = cur.fetchone()
+    from psycopg2.extensions import QueryCanceledError
+    
+    started = time.monotonic()
+    deadline = started + timeout_ms / 1000
+    executor = get_dashboard_executor()
+    # copy_context keeps each query attributed to this request's trace
+    futures = {name: executor.submit(contextvars.copy_context().run, run_section, name, deadline, min_lsn) for name in dict.fromkeys(names)}
+    wait(futures.values(), timeout=timeout_ms / 1000)
+    
+    sections: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    errors: Dict[str, str] = {}
+    
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            errors[name] = 'timeout'
+            continue
+        try:
+            sections[name], elapsed = future.result()
+            timings[name] = round(elapsed, 2)
+        except (QueryCanceledError, TimeoutError):
+            errors[name] = 'timeout'
+        except Exception as error:
+            trace = current_trace()
+            log('reports.dashboard_section_failed', request_id=trace.request_id if trace else None, section=name, error=str(error))
+            errors[name] = 'failed'
+    
+    return {
+        'statusCode': 200 if sections else 504,
+        'headers': headers,
+        'body': dumps({
+            'type': 'dashboard',
+            'generated_at': datetime.now().isoformat(),
+            'sections': sections,
+            'partial': bool(errors),
+            'errors': errors,
+            'timings_ms': timings,
+            'total_ms': round((time.monotonic() - started) * 1000, 2)
+        }),
+        'isBase64Encoded': False
+    }
+
+def encode_export_cursor(sort_key: str, row_id: int) -> str:
+    raw = json.dumps([sort_key, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_export_cursor(cursor: str, parse_sort_key: Callable[[str], Any]) -> List[Any]:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    sort_key, row_id = json.loads(raw)
+    if not isinstance(sort_key, str) or not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError('Invalid cursor')
+    if sort_key != 'infinity':
+        parse_sort_key(sort_key)
+    return [sort_key, row_id]
+
+def write_export_rows(cur, columns: Sequence[str], export_format: str, buffer: io.StringIO) -> Tuple[int, Optional[List[Any]]]:
+    '''
+    Pull rows from a server-side cursor batch by batch and encode them straight
+    into buffer, so only one batch of rows is alive at a time.
+    Returns the number of rows written and the keyset of the last one.
+    '''
+    width = len(columns)
+    writer = csv.writer(buffer)
+    converters = None
+    exported = 0
+    last_keyset = None
+    
+    if export_format == 'csv':
+        writer.writerow(columns)
+    
+    while True:
+        rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+        if not rows:
+            break
         
-        cur.execute("SELECT COUNT(*) as total FROM events WHERE status IN ('planned', 'in_progress')")
-        events_count = cur.fetchone()
+        if converters is None:
+            converters = column_converters(cur.description)[:width]
         
-        cur.execute("SELECT COUNT(*) as total FROM incidents WHERE investigation_status != 'closed'")
-        incidents_count = cur.fetchone()
+        for row in rows:
+            values = [
+                converter(value) if converter and value is not None else value
+                for converter, value in zip(converters, row)
+            ]
+            if export_format == 'csv':
+                writer.writerow(['' if value is None else value for value in values])
+            else:
+                buffer.write(dumps(dict(zip(columns, values))))
+                buffer.write('\n')
         
-        report_data = {
-            'type': 'summary',
-            'generated_at': datetime.now().isoformat(),
-            'statistics': {
-                'total_users': users_count['total'] if users_count else 0,
-                'total_documents': docs_count['total'] if docs_count else 0,
-                'pending_events': events_count['total'] if events_count else 0,
-                'active_incidents': incidents_count['total'] if incidents_count else 0
-            }
-        }
+        exported += len(rows)
+        last_keyset = [rows[-1][width], rows[-1][0]]
     
-    elif report_type == 'documents':
-        cur.execute("""
-            SELECT d.id, d.title, d.doc_type, d.created_at, d.status, 
-                   u.full_name as creator_name
-            FROM documents d
-            LEFT JOIN users u ON d.created_by = u.id
-            WHERE d.status = 'active'
-            ORDER BY d.created_at DESC
-        """)
-        documents = cur.fetchall()
-        
-        report_data = {
-            'type': 'documents',
-            'generated_at': datetime.now().isoformat(),
-            'documents': [dict(doc) for doc in documents]
-        }
+    return exported, last_keyset
+
+def export_report(report_type: str, export_format: str, cursor: Optional[str], min_lsn: Optional[str], headers: Dict[str, str]) -> Dict[str, Any]:
+    spec = EXPORT_QUERIES[report_type]
     
-    elif report_type == 'events':
-        cur.execute("""
-            SELECT e.id, e.title, e.event_type, e.status, e.planned_date, 
-                   e.completed_date, u.full_name as responsible_name
-            FROM events e
-            LEFT JOIN users u ON e.responsible_user_id = u.id
-            ORDER BY e.planned_date DESC
-        """)
-        events = cur.fetchall()
-        
-        report_data = {
-            'type': 'events',
-            'generated_at': datetime.now().isoformat(),
-            'events': [dict(evt) for evt in events]
+    try:
+        after = decode_export_cursor(cursor, spec['parse_sort_key']) if cursor else None
+    except (ValueError, TypeError):
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Invalid cursor'}),
+            'isBase64Encoded': False
         }
     
-    elif report_type == 'training':
-        cur.execute("""
-            SELECT t.id, t.training_type, t.title, t.training_date, t.expiry_date,
-                   t.status, u.full_name as user_name, i.full_name as instructor_name
-            FROM training t
-            LEFT JOIN users u ON t.user_id = u.id
-            LEFT JOIN users i ON t.instructor_id = i.id
-            ORDER BY t.training_date DESC
-            LIMIT 100
-        """)
-        training = cur.fetchall()
-        
-        report_data = {
-            'type': 'training',
-            'generated_at': datetime.now().isoformat(),
-            'training': [dict(t) for t in training]
-        }
+    query = spec['query'].format(after=spec['after'] if after else '')
+    query_params = (after or []) + [EXPORT_MAX_ROWS]
     
-    elif report_type == 'incidents':
-        cur.execute("""
-            SELECT i.id, i.incident_date, i.location, i.description, i.severity,
-                   i.investigation_status, u.full_name as injured_name
-            FROM incidents i
-            LEFT JOIN users u ON i.injured_user_id = u.id
-            ORDER BY i.incident_date DESC
-            LIMIT 100
-        """)
-        incidents = cur.fetchall()
-        
-        report_data = {
-            'type': 'incidents',
-            'generated_at': datetime.now().isoformat(),
-            'incidents': [dict(inc) for inc in incidents]
-        }
+    body = io.StringIO()
     
-    elif report_type == 'sout':
-        cur.execute("""
-            SELECT w.id, w.workplace, w.assessment_date, w.class_conditions,
-                   w.subclass_conditions, w.next_assessment_date, u.full_name as responsible_name
-            FROM work_conditions_assessment w
-            LEFT JOIN users u ON w.responsible_user_id = u.id
-            ORDER BY w.assessment_date DESC
-            LIMIT 100
-        """)
-        assessments = cur.fetchall()
+    with db_connection(readonly=True, min_lsn=min_lsn) as conn:
+        cur = conn.cursor(name=f'export_{report_type}')
+        cur.itersize = EXPORT_BATCH_SIZE
+        cur.execute(query, query_params)
         
-        report_data = {
-            'type': 'sout',
-            'generated_at': datetime.now().isoformat(),
-            'assessments': [dict(a) for a in assessments]
-        }
+        exported, last_keyset = write_export_rows(cur, spec['columns'], export_format, body)
+        
+        cur.close()
+        conn.commit()
+    
+    export_headers = dict(headers)
+    export_headers['Content-Type'] = EXPORT_CONTENT_TYPES[export_format]
+    export_headers['Content-Disposition'] = f'attachment; filename="{report_type}.{export_format}"'
+    export_headers['X-Export-Rows'] = str(exported)
+    export_headers['Access-Control-Expose-Headers'] = 'X-Export-Next-Cursor, X-Export-Rows'
     
-    cur.close()
-    conn.close()
+    if exported >= EXPORT_MAX_ROWS and last_keyset:
+        export_headers['X-Export-Next-Cursor'] = encode_export_cursor(*last_keyset)
     
     return {
         'statusCode': 200,
-        'headers': headers,
-        'body': json.dumps(report_data, default=str),
+        'headers': export_headers,
+        'body': body.getvalue(),
         'isBase64Encoded': False
     }
 
+FORM7_SEVERITY_COLUMNS = """
+    COALESCE(SUM(incident_count) FILTER (WHERE severity = 'minor'), 0) as minor_incidents,
+    COALESCE(SUM(incident_count) FILTER (WHERE severity = 'moderate'), 0) as moderate_incidents,
+    COALESCE(SUM(incident_count) FILTER (WHERE severity = 'severe'), 0) as severe_incidents,
+    COALESCE(SUM(incident_count) FILTER (WHERE severity = 'fatal'), 0) as fatal_incidents
+"""
+
+def parse_form7_period(data: Dict[str, Any]) -> Dict[str, Any]:
+    year = int(data.get('year') or datetime.now().year)
+    quarter = int(data['quarter']) if data.get('quarter') else None
+    month = int(data['month']) if data.get('month') else None
+    years = sorted({year, *(int(y) for y in data.get('compare_years') or [])})
+    
+    if not all(1900 <= y <= 2100 for y in years) or len(years) > 20:
+        raise ValueError('year out of range')
+    if quarter is not None and not 1 <= quarter <= 4:
+        raise ValueError('quarter out of range')
+    if month is not None and not 1 <= month <= 12:
+        raise ValueError('month out of range')
+    
+    if month:
+        first_month, last_month = month, month
+        label = f'{month:02d}.{year}'
+    elif quarter:
+        first_month, last_month = quarter * 3 - 2, quarter * 3
+        label = f'{quarter} квартал {year} года'
+    else:
+        first_month, last_month = 1, 12
+        label = 'Текущий год' if not data.get('year') else f'{year} год'
+    
+    return {
+        'year': year,
+        'years': years,
+        'first_month': first_month,
+        'last_month': last_month,
+        'label': label
+    }
+
+def build_form7(cur, period: Dict[str, Any], by_location: bool) -> Dict[str, Any]:
+    range_params = (
+        date(period['years'][0], 1, 1),
+        date(period['years'][-1] + 1, 1, 1),
+        period['years'],
+        period['first_month'],
+        period['last_month']
+    )
+    range_filter = """
+        period_month >= %s AND period_month < %s
+        AND EXTRACT(YEAR FROM period_month)::int = ANY(%s)
+        AND EXTRACT(MONTH FROM period_month)::int BETWEEN %s AND %s
+    """
+    
+    cur.execute(
+        f"SELECT EXTRACT(YEAR FROM period_month)::int as year, {FORM7_SEVERITY_COLUMNS} FROM incident_rollups WHERE {range_filter} GROUP BY 1",
+        range_params
+    )
+    per_year = {row['year']: dict(row) for row in cur.fetchall()}
+    empty = {'minor_incidents': 0, 'moderate_incidents': 0, 'severe_incidents': 0, 'fatal_incidents': 0}
+    
+    def year_statistics(year: int) -> Dict[str, Any]:
+        stats = dict(per_year.get(year) or empty)
+        stats.pop('year', None)
+        return stats
+    
+    data = {
+        'report_name': 'Форма 7-травматизм',
+        'period': period['label'],
+        'statistics': year_statistics(period['year'])
+    }
+    
+    if len(period['years']) > 1:
+        data['comparison'] = [
+            {'year': year, 'statistics': year_statistics(year)}
+            for year in period['years']
+        ]
+    
+    if by_location:
+        cur.execute(
+            f"SELECT location, {FORM7_SEVERITY_COLUMNS} FROM incident_rollups WHERE {range_filter} GROUP BY location ORDER BY location",
+            (date(period['year'], 1, 1), date(period['year'] + 1, 1, 1), [period['year']], period['first_month'], period['last_month'])
+        )
+        data['by_location'] = [dict(row) for row in cur.fetchall()]
+    
+    return data
+
 def generate_report(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
     body_data = json.loads(event.get('body', '{}'))
     
     report_type = body_data.get('type', 'summary')
     export_format = body_data.get('format', 'json')
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    report_content = {
-        'title': f'Отчёт АСУБТ - {report_type}',
-        'generated_at': datetime.now().isoformat(),
-        'format': export_format
-    }
-    
     if report_type == 'form7':
-        cur.execute("""
-            SELECT 
-                COUNT(*) FILTER (WHERE severity = 'minor') as minor_incidents,
-                COUNT(*) FILTER (WHERE severity = 'moderate') as moderate_incidents,
-                COUNT(*) FILTER (WHERE severity = 'severe') as severe_incidents,
-                COUNT(*) FILTER (WHERE severity = 'fatal') as fatal_incidents
-            FROM incidents
-            WHERE incident_date >= DATE_TRUNC('year', CURRENT_DATE)
-        """)
-        stats = cur.fetchone()
+        try:
+            period = parse_form7_period(body_data)
+        except (ValueError, TypeError):
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'Invalid form7 period'}),
+                'isBase64Encoded': False
+            }
+    
+    with db_connection(readonly=True, min_lsn=read_after_lsn(event)) as conn:
+        cur = dict_cursor(conn)
         
-        report_content['data'] = {
-            'report_name': 'Форма 7-травматизм',
-            'period': 'Текущий год',
-            'statistics': dict(stats) if stats else {}
+        report_content = {
+            'title': f'Отчёт АСУБТ - {report_type}',
+            'generated_at': datetime.now().isoformat(),
+            'format': export_format
         }
-    
-    cur.close()
-    conn.close()
+        
+        if report_type == 'form7':
+            report_content['data'] = build_form7(cur, period, bool(body_data.get('by_location')))
+        
+        cur.close()
     
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps({
+        'body': dumps({
             'success': True,
             'report': report_content,
             'download_ready': True,
             'message': f'Отчёт в формате {export_format} готов к скачиванию'
-        }, default=str),
+        }),
         'isBase64Encoded': False
     }
@@ -0,0 +1,228 @@
+'''
+Request instrumentation for ASUBT backend functions
+Records phase timings (pool acquire, query, fetch, serialize, compress), query
+fingerprints, row counts and payload size per request, tagged with the request id,
+and writes one structured log line per request plus one per slow query.
+SERVER_TIMING=1 also returns the phases in a Server-Timing response header.
+Each function directory ships an identical copy of this module.
+'''
+
+import contextvars
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '') in ('1', 'true', 'yes')
+LOG_REQUESTS = os.environ.get('INSTRUMENT_LOG_REQUESTS', '1') in ('1', 'true', 'yes')
+TOP_QUERIES = 5
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_VALUE_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+')
+_WHITESPACE = re.compile(r'\s+')
+
+class RequestTrace:
+    def __init__(self, request_id: str, function_name: str):
+        self.request_id = request_id
+        self.function_name = function_name
+        self.phases: Dict[str, float] = {}
+        self.queries: Dict[str, Dict[str, Any]] = {}
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_query(self, fingerprint: str, text: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.queries.setdefault(fingerprint, {'query': text[:200], 'calls': 0, 'ms': 0.0})
+            entry['calls'] += 1
+            entry['ms'] += seconds * 1000
+            self.phases['query'] = self.phases.get('query', 0.0) + seconds
+
+    def add_rows(self, count: int, seconds: float) -> None:
+        with self._lock:
+            self.rows += count
+            self.phases['fetch'] = self.phases.get('fetch', 0.0) + seconds
+
+_current: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar('request_trace', default=None)
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+def record_phase(name: str, seconds: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add_phase(name, seconds)
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+def normalize_query(query: Any) -> str:
+    text = query.decode('utf-8', 'replace') if isinstance(query, (bytes, bytearray)) else str(query)
+    text = _STRING_LITERAL.sub('?', text)
+    text = text.replace('%s', '?')
+    text = re.sub(r'%\(\w+\)s', '?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _VALUE_LISTS.sub('(?), ...', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12]
+
+def log(event: str, **fields: Any) -> None:
+    print(json.dumps({'event': event, **fields}, ensure_ascii=False, default=str))
+
+def observe_query(query: Any, seconds: float, rowcount: int) -> None:
+    trace = _current.get()
+    if trace is None and seconds * 1000 < SLOW_QUERY_MS:
+        return
+    normalized = normalize_query(query)
+    query_id = fingerprint(normalized)
+    if trace is not None:
+        trace.add_query(query_id, normalized, seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        log(
+            'slow_query',
+            request_id=trace.request_id if trace else None,
+            function=trace.function_name if trace else None,
+            fingerprint=query_id,
+            ms=round(seconds * 1000, 2),
+            rowcount=rowcount,
+            query=normalized[:1000]
+        )
+
+class InstrumentedCursorMixin:
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            observe_query(query, time.perf_counter() - started, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            observe_query(query, time.perf_counter() - started, self.rowcount)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            observe_query(sql, time.perf_counter() - started, self.rowcount)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._count_rows(1 if row is not None else 0, started)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        self._count_rows(len(rows), started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._count_rows(len(rows), started)
+        return rows
+
+    def _count_rows(self, count: int, started: float) -> None:
+        trace = _current.get()
+        if trace is not None:
+            trace.add_rows(count, time.perf_counter() - started)
+
+_cursor_classes: Dict[Any, Any] = {}
+_connection_class: Any = None
+
+def instrumented_cursor_class(base: Any) -> Any:
+    cursor_class = _cursor_classes.get(base)
+    if cursor_class is None:
+        cursor_class = type(f'Instrumented{base.__name__}', (InstrumentedCursorMixin, base), {})
+        _cursor_classes[base] = cursor_class
+    return cursor_class
+
+def connection_factory() -> Any:
+    '''psycopg2 connection class whose cursors, of any cursor_factory, are instrumented.'''
+    global _connection_class
+    if _connection_class is None:
+        import psycopg2.extensions
+
+        class InstrumentedConnection(psycopg2.extensions.connection):
+            def cursor(self, *args, **kwargs):
+                base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+                kwargs['cursor_factory'] = instrumented_cursor_class(base)
+                return super().cursor(*args, **kwargs)
+
+        _connection_class = InstrumentedConnection
+    return _connection_class
+
+def get_request_id(event: Dict[str, Any], context: Any) -> str:
+    return (
+        getattr(context, 'request_id', None)
+        or (event.get('requestContext') or {}).get('requestId')
+        or uuid.uuid4().hex
+    )
+
+def server_timing(phases: Dict[str, float], total: float) -> str:
+    parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in phases.items()]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+def instrumented(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        trace = RequestTrace(get_request_id(event, context), getattr(context, 'function_name', None) or handler.__module__)
+        token = _current.set(trace)
+        started = time.perf_counter()
+        status = 500
+        response: Dict[str, Any] = {}
+        try:
+            response = handler(event, context)
+            status = response.get('statusCode', 200)
+            return response
+        finally:
+            total = time.perf_counter() - started
+            _current.reset(token)
+            headers = response.get('headers')
+            if isinstance(headers, dict):
+                headers['X-Request-Id'] = trace.request_id
+                if SERVER_TIMING:
+                    headers['Server-Timing'] = server_timing(trace.phases, total)
+                    headers['Timing-Allow-Origin'] = '*'
+            if LOG_REQUESTS:
+                top = sorted(trace.queries.items(), key=lambda item: item[1]['ms'], reverse=True)[:TOP_QUERIES]
+                log(
+                    'request',
+                    request_id=trace.request_id,
+                    function=trace.function_name,
+                    method=event.get('httpMethod'),
+                    params=event.get('queryStringParameters') or {},
+                    status=status,
+                    total_ms=round(total * 1000, 2),
+                    phases={name: round(seconds * 1000, 2) for name, seconds in trace.phases.items()},
+                    queries=sum(entry['calls'] for entry in trace.queries.values()),
+                    rows=trace.rows,
+                    payload_bytes=len(response.get('body') or ''),
+                    top_queries=[dict(entry, fingerprint=query_id, ms=round(entry['ms'], 2)) for query_id, entry in top]
+                )
+    return wrapper
@@ -0,0 +1,129 @@
+'''
+Cold-start benchmark: import and first-request time per backend function
+Every sample runs in a fresh interpreter, the way a new function instance starts, and
+reports import time, a CORS preflight, a request rejected by validation and, with --dsn,
+a first request that goes to the database. It also records whether psycopg2 was loaded
+before the database was actually needed.
+Usage: python benchmarks/cold_start.py [--samples 10] [--functions auth,events] [--dsn postgresql://...]
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (request rejected before any DB work, first request that needs the DB or None)
+PROBES: Dict[str, Any] = {
+    'auth': (
+        {'httpMethod': 'POST', 'queryStringParameters': {'action': 'login'}, 'body': '{}'},
+        {'httpMethod': 'POST', 'queryStringParameters': {'action': 'validate'}, 'headers': {'X-Auth-Token': 'cold-start'}}
+    ),
+    'events': (
+        {'httpMethod': 'POST', 'body': '{}'},
+        {'httpMethod': 'GET', 'queryStringParameters': {'limit': '20'}}
+    ),
+    'documents': (
+        {'httpMethod': 'POST', 'body': '{}'},
+        {'httpMethod': 'GET', 'queryStringParameters': {'view': 'compact', 'limit': '20'}}
+    ),
+    'reports': (
+        {'httpMethod': 'POST', 'body': '{"type": "form7", "quarter": 9}'},
+        {'httpMethod': 'GET', 'queryStringParameters': {'type': 'summary'}}
+    ),
+    'imports': (
+        {'httpMethod': 'POST', 'queryStringParameters': {'table': 'unknown'}, 'body': ''},
+        None
+    ),
+    'jobs': (
+        {'httpMethod': 'POST', 'queryStringParameters': {'job': 'unknown'}},
+        None
+    ),
+    'notifications': (
+        {'httpMethod': 'GET', 'queryStringParameters': {'count': ''}},
+        {'httpMethod': 'GET', 'queryStringParameters': {'count': ''}, 'headers': {'X-Auth-Token': 'cold-start'}}
+    ),
+    'feed': (
+        {'httpMethod': 'GET', 'queryStringParameters': {'cursor': 'latest'}},
+        {'httpMethod': 'GET', 'queryStringParameters': {}}
+    )
+}
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import index
+imported = time.perf_counter()
+result = {'import_ms': (imported - started) * 1000, 'import_psycopg2': 'psycopg2' in sys.modules}
+probes = json.loads(sys.argv[2])
+steps = [('preflight', {'httpMethod': 'OPTIONS', 'headers': {}})] + [(name, event) for name, event in probes if event]
+for name, event in steps:
+    event.setdefault('headers', {})
+    before = time.perf_counter()
+    response = index.handler(event, None)
+    result[name + '_ms'] = (time.perf_counter() - before) * 1000
+    result[name + '_status'] = response['statusCode']
+    result[name + '_psycopg2'] = 'psycopg2' in sys.modules
+print('COLD_START ' + json.dumps(result))
+'''
+
+def sample(function: str, dsn: Optional[str]) -> Dict[str, Any]:
+    invalid, first = PROBES[function]
+    probes = [('invalid', invalid), ('first_db', first if dsn else None)]
+    env = dict(os.environ, INSTRUMENT_LOG_REQUESTS='0')
+    if dsn:
+        env['DATABASE_URL'] = dsn
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, os.path.join(ROOT, 'backend', function), json.dumps(probes)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    total = (time.perf_counter() - started) * 1000
+    line = next(line for line in output.splitlines() if line.startswith('COLD_START '))
+    return dict(json.loads(line[len('COLD_START '):]), process_ms=total)
+
+def median(samples: List[Dict[str, Any]], key: str) -> Optional[float]:
+    values = [entry[key] for entry in samples if key in entry]
+    return statistics.median(values) if values else None
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--functions', default=','.join(PROBES))
+    parser.add_argument('--dsn', help='DATABASE_URL for the first_db probe; skipped when omitted')
+    parser.add_argument('--json', action='store_true', help='print medians as JSON')
+    args = parser.parse_args()
+
+    report = {}
+    for function in args.functions.split(','):
+        samples = [sample(function, args.dsn) for _ in range(args.samples)]
+        last = samples[-1]
+        report[function] = {
+            'process_ms': median(samples, 'process_ms'),
+            'import_ms': median(samples, 'import_ms'),
+            'preflight_ms': median(samples, 'preflight_ms'),
+            'invalid_ms': median(samples, 'invalid_ms'),
+            'first_db_ms': median(samples, 'first_db_ms'),
+            'psycopg2_after_import': last.get('import_psycopg2'),
+            'psycopg2_after_invalid': last.get('invalid_psycopg2')
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f'median of {args.samples} fresh interpreters (ms)\n')
+    print(f'{"function":<13} {"process":>8} {"import":>8} {"preflight":>10} {"invalid":>8} {"first db":>9}  psycopg2 loaded by')
+    for function, row in report.items():
+        loaded = 'import' if row['psycopg2_after_import'] else ('validation' if row['psycopg2_after_invalid'] else 'first db use')
+        first_db = f'{row["first_db_ms"]:>9.1f}' if row['first_db_ms'] is not None else f'{"-":>9}'
+        print(f'{function:<13} {row["process_ms"]:>8.1f} {row["import_ms"]:>8.1f} {row["preflight_ms"]:>10.2f} {row["invalid_ms"]:>8.2f} {first_db}  {loaded}')
+
+if __name__ == '__main__':
+    main()
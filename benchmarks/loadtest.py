@@ -0,0 +1,361 @@
+'''
+Load test: backend handlers invoked in-process against a local PostgreSQL
+Applies db_migrations/ to a scratch database, seeds synthetic data with generate_series,
+then drives each action at fixed concurrency and records throughput and latency percentiles.
+Usage:
+  python benchmarks/loadtest.py setup --dsn postgresql://localhost/asubt_bench [--reset]
+  python benchmarks/loadtest.py seed --dsn ... --scale 100000
+  python benchmarks/loadtest.py run --dsn ... [--concurrency 8] [--requests 500] [--actions events.list,reports.summary]
+  python benchmarks/loadtest.py diff benchmarks/results/old.json benchmarks/results/new.json [--threshold 10]
+Results are written to benchmarks/results/<commit>-<timestamp>.json unless --output is given.
+'''
+
+import argparse
+import glob
+import importlib
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_DIR = os.path.join(ROOT, 'db_migrations')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+SEED_CHUNK = 1_000_000
+BENCH_PASSWORD = 'loadtest-password'
+
+def connect(dsn: str):
+    import psycopg2
+    return psycopg2.connect(dsn)
+
+def apply_migrations(dsn: str, reset: bool) -> None:
+    conn = connect(dsn)
+    cur = conn.cursor()
+    if reset:
+        cur.execute('DROP SCHEMA public CASCADE; CREATE SCHEMA public')
+        conn.commit()
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, 'V*.sql'))):
+        started = time.perf_counter()
+        with open(path, encoding='utf-8') as file:
+            cur.execute(file.read())
+        conn.commit()
+        print(f'{os.path.basename(path)}  {(time.perf_counter() - started) * 1000:.0f} ms')
+    cur.close()
+    conn.close()
+
+SEED_STATEMENTS: List[Tuple[str, str]] = [
+    ('events', """
+        INSERT INTO events (title, description, event_type, responsible_user_id, planned_date, status)
+        SELECT 'Мероприятие ' || g, 'Плановое мероприятие по охране труда №' || g,
+               (ARRAY['training', 'inspection', 'audit', 'maintenance'])[1 + g %% 4],
+               u.ids[1 + g %% array_length(u.ids, 1)],
+               CURRENT_DATE - 365 + (g %% 730),
+               (ARRAY['planned', 'in_progress', 'completed', 'overdue'])[1 + g %% 4]
+        FROM generate_series(%(start)s, %(end)s) g, (SELECT array_agg(id) as ids FROM users) u
+    """),
+    ('incidents', """
+        INSERT INTO incidents (incident_date, location, description, injured_user_id, severity, investigation_status)
+        SELECT CURRENT_TIMESTAMP - (g %% 1825) * INTERVAL '1 day', 'Участок ' || (g %% 50),
+               'Происшествие №' || g, u.ids[1 + g %% array_length(u.ids, 1)],
+               (ARRAY['minor', 'minor', 'minor', 'moderate', 'moderate', 'severe', 'fatal'])[1 + g %% 7],
+               (ARRAY['pending', 'in_progress', 'completed'])[1 + g %% 3]
+        FROM generate_series(%(start)s, %(end)s) g, (SELECT array_agg(id) as ids FROM users) u
+    """),
+    ('training', """
+        INSERT INTO training (user_id, training_type, title, training_date, expiry_date, status)
+        SELECT u.ids[1 + g %% array_length(u.ids, 1)],
+               (ARRAY['introductory', 'primary', 'repeated', 'targeted'])[1 + g %% 4],
+               'Инструктаж №' || g, CURRENT_DATE - (g %% 730), CURRENT_DATE - (g %% 730) + 365, 'completed'
+        FROM generate_series(%(start)s, %(end)s) g, (SELECT array_agg(id) as ids FROM users) u
+    """),
+    ('documents', """
+        INSERT INTO documents (title, doc_type, content, created_by)
+        SELECT 'Инструкция по охране труда №' || g,
+               (ARRAY['instruction', 'order', 'regulation', 'protocol'])[1 + g %% 4],
+               repeat('Работник обязан соблюдать требования инструкции по охране труда. ', 30 + g %% 40) || g,
+               u.ids[1 + g %% array_length(u.ids, 1)]
+        FROM generate_series(%(start)s, %(end)s) g, (SELECT array_agg(id) as ids FROM users) u
+    """)
+]
+
+def seed(dsn: str, scale: int) -> None:
+    sys.path.insert(0, os.path.join(ROOT, 'backend', 'auth'))
+    from passwords import hash_password
+
+    targets = {'events': scale, 'incidents': scale, 'training': scale, 'documents': max(1, scale // 10)}
+    conn = connect(dsn)
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO users (email, password_hash, full_name, role, department, position)
+        SELECT 'bench' || g || '@example.com', %s, 'Сотрудник ' || g, 'user', 'Цех ' || (g %% 20), 'Специалист'
+        FROM generate_series(1, %s) g
+        ON CONFLICT (email) DO NOTHING
+        """,
+        (hash_password(BENCH_PASSWORD), max(100, scale // 1000))
+    )
+    conn.commit()
+
+    for table, statement in SEED_STATEMENTS:
+        started = time.perf_counter()
+        for start in range(1, targets[table] + 1, SEED_CHUNK):
+            cur.execute(statement, {'start': start, 'end': min(targets[table], start + SEED_CHUNK - 1)})
+            conn.commit()
+        print(f'{table:<10} {targets[table]:>10} rows  {time.perf_counter() - started:.1f} s')
+
+    conn.autocommit = True
+    cur.execute('ANALYZE')
+    cur.close()
+    conn.close()
+
+def load_function(name: str) -> Tuple[Callable[..., Dict[str, Any]], Dict[str, Any]]:
+    '''
+    Import backend/<name>/index.py with its own copies of db, responses, etc.
+    Every function ships modules with the same names, so each set is kept aside
+    and put back into sys.modules before that function's actions run.
+    '''
+    directory = os.path.join(ROOT, 'backend', name)
+    local_names = [file[:-3] for file in os.listdir(directory) if file.endswith('.py')]
+    saved = {module: sys.modules.pop(module) for module in local_names if module in sys.modules}
+    sys.path.insert(0, directory)
+    try:
+        index = importlib.import_module('index')
+        modules = {module: sys.modules[module] for module in local_names if module in sys.modules}
+    finally:
+        sys.path.remove(directory)
+        for module in local_names:
+            sys.modules.pop(module, None)
+        sys.modules.update(saved)
+    return index.handler, modules
+
+def http_event(method: str, params: Optional[Dict[str, str]] = None, body: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'httpMethod': method,
+        'queryStringParameters': params or {},
+        'headers': dict({'Accept-Encoding': 'gzip, br'}, **(headers or {})),
+        'body': json.dumps(body) if body is not None else None,
+        'isBase64Encoded': False
+    }
+
+class Scenario:
+    def __init__(self, id_ranges: Dict[str, int], users: int, token: str):
+        self.id_ranges = id_ranges
+        self.users = users
+        self.token = token
+
+    def pick(self, rng: random.Random, table: str) -> int:
+        return rng.randint(1, max(1, self.id_ranges[table]))
+
+ACTIONS: Dict[str, Tuple[str, Callable[[Scenario, random.Random], Dict[str, Any]]]] = {
+    'auth.login': ('auth', lambda s, rng: http_event('POST', {'action': 'login'}, {'email': f'bench{rng.randint(1, s.users)}@example.com', 'password': BENCH_PASSWORD})),
+    'auth.validate': ('auth', lambda s, rng: http_event('POST', {'action': 'validate'}, {}, {'X-Auth-Token': s.token})),
+    'events.list': ('events', lambda s, rng: http_event('GET', {'limit': '100'})),
+    'events.get': ('events', lambda s, rng: http_event('GET', {'id': str(s.pick(rng, 'events'))})),
+    'events.update': ('events', lambda s, rng: http_event('PUT', body={'id': s.pick(rng, 'events'), 'status': rng.choice(['planned', 'in_progress'])})),
+    'documents.list': ('documents', lambda s, rng: http_event('GET', {'limit': '100'})),
+    'documents.list_compact': ('documents', lambda s, rng: http_event('GET', {'limit': '100', 'view': 'compact'})),
+    'documents.batch': ('documents', lambda s, rng: http_event('GET', {'ids': ','.join(str(s.pick(rng, 'documents')) for _ in range(20))})),
+    'documents.search': ('documents', lambda s, rng: http_event('GET', {'q': rng.choice(['инструкция', 'охрана труда', 'требования'])})),
+    'reports.summary': ('reports', lambda s, rng: http_event('GET', {'type': 'summary'})),
+    'reports.incidents': ('reports', lambda s, rng: http_event('GET', {'type': 'incidents'})),
+    'reports.form7': ('reports', lambda s, rng: http_event('POST', body={'type': 'form7', 'format': 'json', 'compare_years': [datetime.now().year - 1]}))
+}
+
+DEFAULT_ACTIONS = [name for name in ACTIONS if name not in ('auth.login', 'events.update')]
+
+def percentile(samples: List[float], fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+def metric_text(value: Optional[float]) -> str:
+    return 'n/a' if value is None else str(value)
+
+def run_action(name: str, handler: Callable[..., Dict[str, Any]], scenario: Scenario, concurrency: int, requests: int, warmup: int) -> Dict[str, Any]:
+    function = ACTIONS[name][0]
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    sizes: List[int] = []
+    lock = threading.Lock()
+    remaining = [warmup + requests]
+
+    def worker(seed_value: int) -> None:
+        rng = random.Random(seed_value)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                measured = remaining[0] < requests
+            event = ACTIONS[name][1](scenario, rng)
+            started = time.perf_counter()
+            response = handler(event, SimpleNamespace(request_id=f'loadtest-{seed_value}', function_name=function))
+            elapsed = (time.perf_counter() - started) * 1000
+            if not measured:
+                continue
+            with lock:
+                latencies.append(elapsed)
+                sizes.append(len(response.get('body') or ''))
+                status = response.get('statusCode', 500)
+                if status >= 400:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, index) for index in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall > 0 else 0.0,
+        'p50_ms': rounded(percentile(latencies, 0.50)),
+        'p95_ms': rounded(percentile(latencies, 0.95)),
+        'p99_ms': rounded(percentile(latencies, 0.99)),
+        'max_ms': rounded(max(latencies, default=None)),
+        'mean_body_bytes': int(sum(sizes) / len(sizes)) if sizes else None
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def run(args: argparse.Namespace) -> None:
+    # Handlers read their configuration at import time
+    os.environ['DATABASE_URL'] = args.dsn
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.concurrency))
+    # The limiter would otherwise turn most synthetic logins into 429s
+    os.environ.setdefault('RATE_LIMIT_IP_CAPACITY', '1000000000')
+    os.environ.setdefault('RATE_LIMIT_EMAIL_CAPACITY', '1000000000')
+    # One log line per request would be measured along with the handler
+    os.environ.setdefault('INSTRUMENT_LOG_REQUESTS', '0')
+
+    actions = args.actions.split(',') if args.actions else DEFAULT_ACTIONS
+    unknown = [name for name in actions if name not in ACTIONS]
+    if unknown:
+        raise SystemExit(f'Unknown actions: {", ".join(unknown)}. Available: {", ".join(ACTIONS)}')
+
+    conn = connect(args.dsn)
+    cur = conn.cursor()
+    id_ranges = {}
+    for table in ('events', 'documents', 'incidents', 'training'):
+        cur.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        id_ranges[table] = cur.fetchone()[0]
+    cur.execute("SELECT COUNT(*) FROM users WHERE email LIKE %s", ('bench%@example.com',))
+    users = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+
+    if not users:
+        raise SystemExit('No benchmark users found, run the seed command first')
+
+    functions = {name: load_function(name) for name in sorted({ACTIONS[action][0] for action in actions} | {'auth'})}
+
+    sys.modules.update(functions['auth'][1])
+    login = functions['auth'][0](http_event('POST', {'action': 'login'}, {'email': 'bench1@example.com', 'password': BENCH_PASSWORD}), None)
+    token = json.loads(login['body']).get('token', '')
+    scenario = Scenario(id_ranges, users, token)
+
+    results = {}
+    print(f'{"action":<24} {"rps":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"errors":>7}')
+    for action in actions:
+        handler, modules = functions[ACTIONS[action][0]]
+        sys.modules.update(modules)
+        result = run_action(action, handler, scenario, args.concurrency, args.requests, args.warmup)
+        results[action] = result
+        percentiles = ' '.join(f'{metric_text(result[metric]):>8}' for metric in ('p50_ms', 'p95_ms', 'p99_ms'))
+        print(f'{action:<24} {result["throughput_rps"]:>8} {percentiles} {sum(result["errors"].values()):>7}')
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump({
+            'meta': {
+                'commit': commit,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'concurrency': args.concurrency,
+                'requests': args.requests,
+                'rows': id_ranges,
+                'users': users,
+                'python': sys.version.split()[0]
+            },
+            'actions': results
+        }, file, ensure_ascii=False, indent=2)
+    print(f'\nSaved {output}')
+
+def diff(args: argparse.Namespace) -> None:
+    with open(args.old, encoding='utf-8') as file:
+        old = json.load(file)
+    with open(args.new, encoding='utf-8') as file:
+        new = json.load(file)
+
+    print(f'{old["meta"]["commit"]} -> {new["meta"]["commit"]}  (regression threshold {args.threshold:.0f}%)\n')
+    print(f'{"action":<24} {"metric":<15} {"old":>10} {"new":>10} {"change":>9}')
+    regressions = 0
+    for action in sorted(set(old['actions']) & set(new['actions'])):
+        for metric, higher_is_better in (('throughput_rps', True), ('p50_ms', False), ('p95_ms', False), ('p99_ms', False)):
+            before = old['actions'][action][metric]
+            after = new['actions'][action][metric]
+            if before is None or after is None:
+                print(f'{action:<24} {metric:<15} {metric_text(before):>10} {metric_text(after):>10} {"n/a":>9}')
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            regressed = (change < -args.threshold) if higher_is_better else (change > args.threshold)
+            regressions += regressed
+            print(f'{action:<24} {metric:<15} {before:>10} {after:>10} {change:>+8.1f}%{"  REGRESSION" if regressed else ""}')
+
+    if regressions:
+        raise SystemExit(1)
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    setup_parser = commands.add_parser('setup', help='apply db_migrations to the benchmark database')
+    setup_parser.add_argument('--dsn', required=True)
+    setup_parser.add_argument('--reset', action='store_true', help='drop and recreate the public schema first')
+
+    seed_parser = commands.add_parser('seed', help='insert synthetic rows')
+    seed_parser.add_argument('--dsn', required=True)
+    seed_parser.add_argument('--scale', type=int, default=10_000, help='rows each for events, incidents and training; documents get scale/10')
+
+    run_parser = commands.add_parser('run', help='drive handlers and record latencies')
+    run_parser.add_argument('--dsn', required=True)
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--requests', type=int, default=500, help='measured requests per action')
+    run_parser.add_argument('--warmup', type=int, default=20)
+    run_parser.add_argument('--actions', help=f'comma-separated, default: {",".join(DEFAULT_ACTIONS)}')
+    run_parser.add_argument('--output')
+
+    diff_parser = commands.add_parser('diff', help='compare two result files')
+    diff_parser.add_argument('old')
+    diff_parser.add_argument('new')
+    diff_parser.add_argument('--threshold', type=float, default=10.0, help='percent change counted as a regression')
+
+    args = parser.parse_args()
+    if args.command == 'setup':
+        apply_migrations(args.dsn, args.reset)
+    elif args.command == 'seed':
+        seed(args.dsn, args.scale)
+    elif args.command == 'run':
+        run(args)
+    else:
+        diff(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+'''
+Calibration benchmark: scrypt cost vs login latency for backend/auth/passwords.py
+Picks the largest PASSWORD_SCRYPT_N whose p99 verify time stays inside the budget.
+Run it on the same instance size the auth function is deployed with.
+Usage: python benchmarks/password_hash_bench.py [--budget-ms 100] [--samples 30]
+'''
+
+import argparse
+import importlib.util
+import os
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_passwords():
+    path = os.path.join(ROOT, 'backend', 'auth', 'passwords.py')
+    spec = importlib.util.spec_from_file_location('passwords', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def measure(passwords, n: int, r: int, p: int, samples: int) -> List[float]:
+    stored = passwords.hash_password('correct horse battery staple', n=n, r=r, p=p)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        passwords.verify_password('correct horse battery staple', stored)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, default=100.0, help='p99 verify time allowed per login')
+    parser.add_argument('--samples', type=int, default=30)
+    parser.add_argument('--min-log2n', type=int, default=12)
+    parser.add_argument('--max-log2n', type=int, default=17)
+    parser.add_argument('-r', type=int, default=8)
+    parser.add_argument('-p', type=int, default=1)
+    args = parser.parse_args()
+
+    passwords = load_passwords()
+    recommended = None
+
+    print(f'{"N":>8} {"p50 ms":>9} {"p99 ms":>9} {"mem MiB":>8}')
+    for log2n in range(args.min_log2n, args.max_log2n + 1):
+        n = 2 ** log2n
+        timings = measure(passwords, n, args.r, args.p, args.samples)
+        p99 = percentile(timings, 0.99)
+        memory = 128 * n * args.r * args.p / (1024 * 1024)
+        within = p99 <= args.budget_ms
+        print(f'{n:>8} {percentile(timings, 0.5):>9.1f} {p99:>9.1f} {memory:>8.0f}{"" if within else "  over budget"}')
+        if within:
+            recommended = n
+        else:
+            break
+
+    if recommended is None:
+        print(f'\nNo cost fits {args.budget_ms:.0f} ms; raise the budget or lower --min-log2n')
+    else:
+        print(f'\nPASSWORD_SCRYPT_N={recommended}  (r={args.r}, p={args.p}, budget {args.budget_ms:.0f} ms p99)')
+        print('Existing hashes with other parameters are upgraded on the next successful login.')
+
+if __name__ == '__main__':
+    main()
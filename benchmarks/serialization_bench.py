@@ -0,0 +1,80 @@
+'''
+Micro-benchmark: shared serializer vs the previous dict(row) + json.dumps(default=str) path
+Usage: python benchmarks/serialization_bench.py [--rows 100] [--repeat 200]
+'''
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_serialization():
+    directory = os.path.join(ROOT, 'backend', 'events')
+    # serialization.py imports its sibling instrumentation module
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    path = os.path.join(directory, 'serialization.py')
+    spec = importlib.util.spec_from_file_location('serialization', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class FakeCursor:
+    # (name, type_code) pairs as psycopg2 exposes them in cursor.description
+    description = [
+        ('id', 23), ('title', 1043), ('description', 25), ('event_type', 1043),
+        ('responsible_user_id', 23), ('planned_date', 1082), ('completed_date', 1082),
+        ('status', 1043), ('created_at', 1114), ('updated_at', 1114),
+        ('cost', 1700), ('responsible_name', 1043)
+    ]
+
+def make_rows(count: int) -> List[Tuple[Any, ...]]:
+    now = datetime(2025, 3, 1, 9, 30, 15, 123456)
+    return [
+        (
+            index, f'Инструктаж по охране труда №{index}', 'Плановый повторный инструктаж ' * 3,
+            'training', index % 50, date(2025, 1, 1) + timedelta(days=index % 365),
+            None if index % 3 else date(2025, 2, 1), 'planned', now, now,
+            Decimal('1500.50'), 'Иванов Иван Иванович'
+        )
+        for index in range(count)
+    ]
+
+def legacy_encode(cur: FakeCursor, rows: List[Tuple[Any, ...]]) -> str:
+    names = [column[0] for column in cur.description]
+    records = [dict(zip(names, row)) for row in rows]
+    return json.dumps({'events': [dict(record) for record in records]}, default=str)
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    
+    serialization = load_serialization()
+    cur = FakeCursor()
+    rows = make_rows(args.rows)
+    
+    def shared_encode() -> str:
+        return serialization.dumps({'events': serialization.rows_to_dicts(cur, rows)})
+    
+    assert json.loads(shared_encode()) == json.loads(legacy_encode(cur, rows))
+    
+    legacy = min(timeit.repeat(lambda: legacy_encode(cur, rows), number=args.repeat, repeat=5)) / args.repeat
+    shared = min(timeit.repeat(shared_encode, number=args.repeat, repeat=5)) / args.repeat
+    encoder = 'orjson' if serialization.orjson is not None else 'json'
+    
+    print(f'rows per payload: {args.rows}')
+    print(f'legacy  json.dumps(default=str): {legacy * 1e3:8.3f} ms')
+    print(f'shared  serializer ({encoder:6}):   {shared * 1e3:8.3f} ms')
+    print(f'speedup: {legacy / shared:.2f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+-- Составные индексы для постраничной выборки по ключу (keyset pagination)
+
+-- Мероприятия: сортировка по плановой дате (пустые даты первыми) и id
+CREATE INDEX idx_events_planned_keyset ON events ((COALESCE(planned_date, 'infinity'::date)) DESC, id DESC);
+CREATE INDEX idx_events_status_planned_keyset ON events (status, (COALESCE(planned_date, 'infinity'::date)) DESC, id DESC);
+
+-- Документы: только активные, сортировка по дате создания (пустые даты первыми) и id
+CREATE INDEX idx_documents_active_keyset ON documents ((COALESCE(created_at, 'infinity'::timestamp)) DESC, id DESC) WHERE status = 'active';
+CREATE INDEX idx_documents_active_type_keyset ON documents (doc_type, (COALESCE(created_at, 'infinity'::timestamp)) DESC, id DESC) WHERE status = 'active';
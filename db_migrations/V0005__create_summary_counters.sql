@@ -0,0 +1,135 @@
+-- Счётчики для сводного отчёта, поддерживаемые триггерами в той же транзакции, что и запись
+
+CREATE TABLE IF NOT EXISTS summary_counters (
+    name VARCHAR(50) PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION bump_summary_counter(counter_name TEXT, delta INTEGER) RETURNS void AS $$
+BEGIN
+    IF delta <> 0 THEN
+        UPDATE summary_counters
+        SET value = value + delta, updated_at = CURRENT_TIMESTAMP
+        WHERE name = counter_name;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггеры уровня оператора: одно изменение счётчика на оператор по таблицам переходов,
+-- поэтому пакетная вставка или массовое обновление не блокируют строку счётчика построчно
+
+-- Активные пользователи
+CREATE OR REPLACE FUNCTION track_active_users() RETURNS trigger AS $$
+DECLARE
+    delta INTEGER := 0;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        delta := delta + (SELECT COUNT(*) FROM new_rows WHERE is_active);
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        delta := delta - (SELECT COUNT(*) FROM old_rows WHERE is_active);
+    END IF;
+    PERFORM bump_summary_counter('active_users', delta);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Действующие документы
+CREATE OR REPLACE FUNCTION track_active_documents() RETURNS trigger AS $$
+DECLARE
+    delta INTEGER := 0;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        delta := delta + (SELECT COUNT(*) FROM new_rows WHERE status = 'active');
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        delta := delta - (SELECT COUNT(*) FROM old_rows WHERE status = 'active');
+    END IF;
+    PERFORM bump_summary_counter('active_documents', delta);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Запланированные и выполняемые мероприятия
+CREATE OR REPLACE FUNCTION track_pending_events() RETURNS trigger AS $$
+DECLARE
+    delta INTEGER := 0;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        delta := delta + (SELECT COUNT(*) FROM new_rows WHERE status IN ('planned', 'in_progress'));
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        delta := delta - (SELECT COUNT(*) FROM old_rows WHERE status IN ('planned', 'in_progress'));
+    END IF;
+    PERFORM bump_summary_counter('pending_events', delta);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Незакрытые расследования происшествий
+CREATE OR REPLACE FUNCTION track_active_incidents() RETURNS trigger AS $$
+DECLARE
+    delta INTEGER := 0;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        delta := delta + (SELECT COUNT(*) FROM new_rows WHERE investigation_status <> 'closed');
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        delta := delta - (SELECT COUNT(*) FROM old_rows WHERE investigation_status <> 'closed');
+    END IF;
+    PERFORM bump_summary_counter('active_incidents', delta);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_users_summary_counter_insert
+    AFTER INSERT ON users REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_active_users();
+CREATE TRIGGER trg_users_summary_counter_update
+    AFTER UPDATE ON users REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_active_users();
+CREATE TRIGGER trg_users_summary_counter_delete
+    AFTER DELETE ON users REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_active_users();
+
+CREATE TRIGGER trg_documents_summary_counter_insert
+    AFTER INSERT ON documents REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_active_documents();
+CREATE TRIGGER trg_documents_summary_counter_update
+    AFTER UPDATE ON documents REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_active_documents();
+CREATE TRIGGER trg_documents_summary_counter_delete
+    AFTER DELETE ON documents REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_active_documents();
+
+CREATE TRIGGER trg_events_summary_counter_insert
+    AFTER INSERT ON events REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_pending_events();
+CREATE TRIGGER trg_events_summary_counter_update
+    AFTER UPDATE ON events REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_pending_events();
+CREATE TRIGGER trg_events_summary_counter_delete
+    AFTER DELETE ON events REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_pending_events();
+
+CREATE TRIGGER trg_incidents_summary_counter_insert
+    AFTER INSERT ON incidents REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_active_incidents();
+CREATE TRIGGER trg_incidents_summary_counter_update
+    AFTER UPDATE ON incidents REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_active_incidents();
+CREATE TRIGGER trg_incidents_summary_counter_delete
+    AFTER DELETE ON incidents REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_active_incidents();
+
+-- Начальное заполнение по текущим данным
+INSERT INTO summary_counters (name, value)
+SELECT 'active_users', COUNT(*) FROM users WHERE is_active = true
+UNION ALL
+SELECT 'active_documents', COUNT(*) FROM documents WHERE status = 'active'
+UNION ALL
+SELECT 'pending_events', COUNT(*) FROM events WHERE status IN ('planned', 'in_progress')
+UNION ALL
+SELECT 'active_incidents', COUNT(*) FROM incidents WHERE investigation_status != 'closed'
+ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value, updated_at = CURRENT_TIMESTAMP;
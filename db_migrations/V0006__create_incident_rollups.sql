@@ -0,0 +1,49 @@
+-- Помесячные итоги по происшествиям (месяц × тяжесть × место) для формы 7-травматизм
+
+CREATE TABLE IF NOT EXISTS incident_rollups (
+    period_month DATE NOT NULL,
+    severity VARCHAR(50) NOT NULL,
+    location VARCHAR(255) NOT NULL,
+    incident_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period_month, severity, location)
+);
+
+-- Параметры совпадают с именами столбцов, поэтому они квалифицированы именем функции, а конфликт задан ограничением
+CREATE OR REPLACE FUNCTION bump_incident_rollup(incident_date TIMESTAMP, severity VARCHAR, location VARCHAR, delta INTEGER) RETURNS void AS $$
+BEGIN
+    INSERT INTO incident_rollups AS r (period_month, severity, location, incident_count)
+    VALUES (DATE_TRUNC('month', bump_incident_rollup.incident_date)::date, COALESCE(bump_incident_rollup.severity, 'unspecified'), bump_incident_rollup.location, delta)
+    ON CONFLICT ON CONSTRAINT incident_rollups_pkey
+    DO UPDATE SET incident_count = r.incident_count + EXCLUDED.incident_count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_incident_rollups() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        IF NEW.incident_date IS NOT DISTINCT FROM OLD.incident_date
+           AND NEW.severity IS NOT DISTINCT FROM OLD.severity
+           AND NEW.location IS NOT DISTINCT FROM OLD.location THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM bump_incident_rollup(OLD.incident_date, OLD.severity, OLD.location, -1);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM bump_incident_rollup(NEW.incident_date, NEW.severity, NEW.location, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_incidents_rollup
+    AFTER INSERT OR UPDATE OF incident_date, severity, location OR DELETE ON incidents
+    FOR EACH ROW EXECUTE FUNCTION track_incident_rollups();
+
+-- Начальное заполнение по накопленным происшествиям
+INSERT INTO incident_rollups (period_month, severity, location, incident_count)
+SELECT DATE_TRUNC('month', incident_date)::date, COALESCE(severity, 'unspecified'), location, COUNT(*)
+FROM incidents
+GROUP BY 1, 2, 3
+ON CONFLICT (period_month, severity, location) DO UPDATE SET incident_count = EXCLUDED.incident_count;
@@ -0,0 +1,9 @@
+-- Полнотекстовый поиск по названию и содержанию документов (русская морфология)
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(content, '')), 'B')
+    ) STORED;
+
+CREATE INDEX idx_documents_search ON documents USING GIN (search_vector);
@@ -0,0 +1,34 @@
+-- Естественные ключи для пакетной загрузки (upsert) обучения, СИЗ и медосмотров
+
+-- Дубликаты, введённые вручную, не удаляем: миграция останавливается и перечисляет их для ручного разбора
+DO $$
+DECLARE
+    conflicts TEXT;
+BEGIN
+    SELECT string_agg(conflict, E'\n') INTO conflicts
+    FROM (
+        SELECT 'training ids ' || string_agg(id::text, ', ' ORDER BY id) AS conflict
+        FROM training
+        GROUP BY user_id, training_type, title, training_date
+        HAVING COUNT(*) > 1
+        UNION ALL
+        SELECT 'ppe ids ' || string_agg(id::text, ', ' ORDER BY id)
+        FROM ppe
+        GROUP BY user_id, ppe_type, ppe_name, issue_date
+        HAVING COUNT(*) > 1
+        UNION ALL
+        SELECT 'medical_examinations ids ' || string_agg(id::text, ', ' ORDER BY id)
+        FROM medical_examinations
+        GROUP BY user_id, exam_type, exam_date
+        HAVING COUNT(*) > 1
+    ) duplicates;
+
+    IF conflicts IS NOT NULL THEN
+        RAISE EXCEPTION 'Duplicate records block the import natural keys, resolve them manually:%', E'\n' || conflicts;
+    END IF;
+END
+$$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_training_user_type_title_date ON training(user_id, training_type, title, training_date);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_ppe_user_item_issue ON ppe(user_id, ppe_type, ppe_name, issue_date);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_medical_user_type_date ON medical_examinations(user_id, exam_type, exam_date);
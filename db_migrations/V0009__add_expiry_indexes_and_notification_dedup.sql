@@ -0,0 +1,10 @@
+-- Индексы по срокам действия для ежедневной проверки и ключ дедупликации уведомлений
+
+CREATE INDEX IF NOT EXISTS idx_training_expiry ON training(expiry_date) WHERE expiry_date IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_ppe_expiry ON ppe(expiry_date) WHERE expiry_date IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_medical_next_exam ON medical_examinations(next_exam_date) WHERE next_exam_date IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_sout_next_assessment ON work_conditions_assessment(next_assessment_date) WHERE next_assessment_date IS NOT NULL;
+
+-- Повторный запуск проверки не должен создавать одинаковые напоминания
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS dedup_key VARCHAR(255);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_notifications_dedup_key ON notifications(dedup_key) WHERE dedup_key IS NOT NULL;
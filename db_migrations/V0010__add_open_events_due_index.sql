@@ -0,0 +1,3 @@
+-- Частичный индекс для перевода просроченных мероприятий в статус overdue
+
+CREATE INDEX IF NOT EXISTS idx_events_open_planned ON events(planned_date) WHERE status IN ('planned', 'in_progress');
@@ -0,0 +1,8 @@
+-- Общее состояние блокировок входа для нескольких экземпляров функции auth (RATE_LIMIT_SHARED=1)
+
+CREATE TABLE IF NOT EXISTS auth_lockouts (
+    email VARCHAR(255) PRIMARY KEY,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_failure_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_until TIMESTAMP
+);
@@ -0,0 +1,17 @@
+-- История версий документов: сжатые построчные дельты с периодическими полными снимками
+
+CREATE TABLE IF NOT EXISTS document_versions (
+    document_id INTEGER NOT NULL REFERENCES documents(id),
+    version INTEGER NOT NULL,
+    kind VARCHAR(10) NOT NULL CHECK (kind IN ('snapshot', 'delta')),
+    payload BYTEA NOT NULL,
+    title VARCHAR(500),
+    file_url VARCHAR(500),
+    content_length INTEGER,
+    created_by INTEGER REFERENCES users(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (document_id, version)
+);
+
+-- Поиск ближайшего снимка при восстановлении версии
+CREATE INDEX IF NOT EXISTS idx_document_versions_snapshots ON document_versions(document_id, version) WHERE kind = 'snapshot';
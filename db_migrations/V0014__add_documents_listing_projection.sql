@@ -0,0 +1,7 @@
+-- Длина и превью содержания для облегчённых списков документов: список не читает TOAST-значение content
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_length INTEGER
+    GENERATED ALWAYS AS (char_length(COALESCE(content, ''))) STORED;
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_preview VARCHAR(200)
+    GENERATED ALWAYS AS (left(regexp_replace(left(COALESCE(content, ''), 400), '\s+', ' ', 'g'), 200)) STORED;
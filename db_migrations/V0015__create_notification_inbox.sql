@@ -0,0 +1,77 @@
+-- Лента уведомлений: индексы под постраничную выдачу и счётчик непрочитанных для значка
+
+UPDATE notifications SET is_read = false WHERE is_read IS NULL;
+UPDATE notifications SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE notifications ALTER COLUMN is_read SET NOT NULL;
+ALTER TABLE notifications ALTER COLUMN created_at SET NOT NULL;
+
+-- Лента пользователя, новые сверху; заменяет индекс только по user_id
+CREATE INDEX IF NOT EXISTS idx_notifications_inbox ON notifications(user_id, created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_notifications_user;
+
+-- Только непрочитанные: фильтр ленты и «прочитать всё» не трогают историю пользователя
+CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_id, created_at DESC, id DESC) WHERE NOT is_read;
+
+CREATE TABLE IF NOT EXISTS notification_unread_counts (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    unread INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Триггеры уровня оператора: массовое «прочитать» обновляет строку счётчика один раз на пользователя
+CREATE OR REPLACE FUNCTION track_unread_notifications() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO notification_unread_counts AS c (user_id, unread)
+        SELECT n.user_id, COUNT(*) FROM new_rows n
+        WHERE NOT n.is_read AND n.user_id IS NOT NULL
+        GROUP BY n.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET unread = c.unread + EXCLUDED.unread, updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO notification_unread_counts AS c (user_id, unread)
+        SELECT d.user_id, SUM(d.delta) FROM (
+            SELECT n.user_id, 1 AS delta FROM new_rows n WHERE NOT n.is_read
+            UNION ALL
+            SELECT o.user_id, -1 FROM old_rows o WHERE NOT o.is_read
+        ) d
+        WHERE d.user_id IS NOT NULL
+        GROUP BY d.user_id
+        HAVING SUM(d.delta) <> 0
+        ON CONFLICT (user_id) DO UPDATE
+        SET unread = c.unread + EXCLUDED.unread, updated_at = CURRENT_TIMESTAMP;
+    ELSE
+        UPDATE notification_unread_counts c
+        SET unread = c.unread - d.removed, updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT o.user_id, COUNT(*) AS removed FROM old_rows o
+            WHERE NOT o.is_read AND o.user_id IS NOT NULL
+            GROUP BY o.user_id
+        ) d
+        WHERE c.user_id = d.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_notifications_unread_insert
+    AFTER INSERT ON notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_unread_notifications();
+
+CREATE TRIGGER trg_notifications_unread_update
+    AFTER UPDATE ON notifications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_unread_notifications();
+
+CREATE TRIGGER trg_notifications_unread_delete
+    AFTER DELETE ON notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_unread_notifications();
+
+-- Начальное заполнение по текущим данным
+INSERT INTO notification_unread_counts (user_id, unread)
+SELECT user_id, COUNT(*) FROM notifications
+WHERE NOT is_read AND user_id IS NOT NULL
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET unread = EXCLUDED.unread, updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,96 @@
+-- Журнал изменений для ленты: строка на каждую изменённую запись и pg_notify после фиксации транзакции
+
+CREATE TABLE IF NOT EXISTS change_log (
+    seq BIGSERIAL PRIMARY KEY,
+    txid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    table_name VARCHAR(63) NOT NULL,
+    op VARCHAR(10) NOT NULL,
+    row_id INTEGER NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Лента читается по (txid, seq): номер seq выдаётся при вставке, а фиксация может прийти в другом порядке
+CREATE INDEX IF NOT EXISTS idx_change_log_position ON change_log(txid, seq);
+CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log(changed_at);
+
+-- Один pg_notify на оператор с компактным описанием; подписчики дочитывают строки из change_log.
+-- Аргументы триггера (колонка, значение) описывают мягкое удаление: переход в это значение пишется как 'delete'
+CREATE OR REPLACE FUNCTION record_changes() RETURNS trigger AS $$
+DECLARE
+    last_seq BIGINT;
+    changed INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        WITH logged AS (
+            INSERT INTO change_log (table_name, op, row_id)
+            SELECT TG_TABLE_NAME, 'delete', o.id FROM old_rows o ORDER BY o.id
+            RETURNING seq
+        )
+        SELECT MAX(seq), COUNT(*) INTO last_seq, changed FROM logged;
+    ELSIF TG_OP = 'INSERT' THEN
+        WITH logged AS (
+            INSERT INTO change_log (table_name, op, row_id)
+            SELECT TG_TABLE_NAME, 'insert', n.id FROM new_rows n ORDER BY n.id
+            RETURNING seq
+        )
+        SELECT MAX(seq), COUNT(*) INTO last_seq, changed FROM logged;
+    ELSIF TG_NARGS = 2 THEN
+        WITH logged AS (
+            INSERT INTO change_log (table_name, op, row_id)
+            SELECT TG_TABLE_NAME,
+                   CASE WHEN to_jsonb(n) ->> TG_ARGV[0] = TG_ARGV[1]
+                             AND to_jsonb(o) ->> TG_ARGV[0] IS DISTINCT FROM TG_ARGV[1]
+                        THEN 'delete' ELSE 'update' END,
+                   n.id
+            FROM new_rows n JOIN old_rows o ON o.id = n.id
+            ORDER BY n.id
+            RETURNING seq
+        )
+        SELECT MAX(seq), COUNT(*) INTO last_seq, changed FROM logged;
+    ELSE
+        WITH logged AS (
+            INSERT INTO change_log (table_name, op, row_id)
+            SELECT TG_TABLE_NAME, 'update', n.id FROM new_rows n ORDER BY n.id
+            RETURNING seq
+        )
+        SELECT MAX(seq), COUNT(*) INTO last_seq, changed FROM logged;
+    END IF;
+
+    IF changed > 0 THEN
+        PERFORM pg_notify('asubt_changes', json_build_object(
+            'table', TG_TABLE_NAME, 'op', lower(TG_OP), 'seq', last_seq, 'count', changed
+        )::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_events_changes_insert
+    AFTER INSERT ON events REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_changes();
+CREATE TRIGGER trg_events_changes_update
+    AFTER UPDATE ON events REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_changes();
+CREATE TRIGGER trg_events_changes_delete
+    AFTER DELETE ON events REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_changes();
+
+CREATE TRIGGER trg_documents_changes_insert
+    AFTER INSERT ON documents REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_changes();
+CREATE TRIGGER trg_documents_changes_update
+    AFTER UPDATE ON documents REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_changes('status', 'deleted');
+CREATE TRIGGER trg_documents_changes_delete
+    AFTER DELETE ON documents REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_changes();
+
+CREATE TRIGGER trg_incidents_changes_insert
+    AFTER INSERT ON incidents REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_changes();
+CREATE TRIGGER trg_incidents_changes_update
+    AFTER UPDATE ON incidents REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_changes();
+CREATE TRIGGER trg_incidents_changes_delete
+    AFTER DELETE ON incidents REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_changes();
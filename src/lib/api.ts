@@ -0,0 +1,27 @@
+const WRITE_LSN_HEADER = 'X-Write-LSN';
+const WRITE_LSN_KEY = 'asubt_write_lsn';
+
+const parseLsn = (lsn: string): bigint => {
+  const [high, low] = lsn.split('/');
+  return (BigInt(`0x${high}`) << 32n) + BigInt(`0x${low}`);
+};
+
+const rememberWriteLsn = (lsn: string | null) => {
+  if (!lsn) return;
+  const current = sessionStorage.getItem(WRITE_LSN_KEY);
+  if (!current || parseLsn(lsn) > parseLsn(current)) {
+    sessionStorage.setItem(WRITE_LSN_KEY, lsn);
+  }
+};
+
+// Sends back the position of our latest write so reads served by a read replica
+// include it, and remembers the position returned by writes.
+export async function apiFetch(input: string, init: RequestInit = {}): Promise<Response> {
+  const headers = new Headers(init.headers);
+  const lsn = sessionStorage.getItem(WRITE_LSN_KEY);
+  if (lsn) headers.set(WRITE_LSN_HEADER, lsn);
+
+  const response = await fetch(input, { ...init, headers });
+  rememberWriteLsn(response.headers.get(WRITE_LSN_HEADER));
+  return response;
+}
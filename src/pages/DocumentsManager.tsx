@@ -12,6 +12,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { apiFetch } from '@/lib/api';
 
 const DOCUMENTS_API = 'https://functions.poehali.dev/d940a7a8-1b92-42cb-bd0e-91edd2859dbb';
 
@@ -51,7 +52,7 @@ const DocumentsManager = () => {
   const loadDocuments = async () => {
     setLoading(true);
     try {
-      const response = await fetch(DOCUMENTS_API);
+      const response = await apiFetch(`${DOCUMENTS_API}?view=compact`);
       const data = await response.json();
       setDocuments(data.documents || []);
     } catch (error) {
@@ -70,7 +71,7 @@ const DocumentsManager = () => {
     setLoading(true);
 
     try {
-      const response = await fetch(DOCUMENTS_API, {
+      const response = await apiFetch(DOCUMENTS_API, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -104,7 +105,7 @@ const DocumentsManager = () => {
     if (!confirm('Удалить документ?')) return;
 
     try {
-      const response = await fetch(`${DOCUMENTS_API}?id=${id}`, {
+      const response = await apiFetch(`${DOCUMENTS_API}?id=${id}`, {
         method: 'DELETE',
       });
 
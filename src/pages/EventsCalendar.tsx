@@ -6,6 +6,7 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/com
 import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { apiFetch } from '@/lib/api';
 import { format, startOfMonth, endOfMonth, eachDayOfInterval, isSameMonth, isSameDay, parseISO, isToday, isBefore, startOfDay } from 'date-fns';
 import { ru } from 'date-fns/locale';
 
@@ -42,7 +43,7 @@ const EventsCalendar = () => {
   const loadEvents = async () => {
     setLoading(true);
     try {
-      const response = await fetch(EVENTS_API);
+      const response = await apiFetch(EVENTS_API);
       const data = await response.json();
       setEvents(data.events || []);
     } catch (error) {
@@ -12,6 +12,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { apiFetch } from '@/lib/api';
 
 const EVENTS_API = 'https://functions.poehali.dev/01750521-d47a-4fbc-b622-02c2b57bd583';
 
@@ -52,7 +53,7 @@ const EventsManager = () => {
   const loadEvents = async () => {
     setLoading(true);
     try {
-      const response = await fetch(EVENTS_API);
+      const response = await apiFetch(EVENTS_API);
       const data = await response.json();
       setEvents(data.events || []);
     } catch (error) {
@@ -71,7 +72,7 @@ const EventsManager = () => {
     setLoading(true);
 
     try {
-      const response = await fetch(EVENTS_API, {
+      const response = await apiFetch(EVENTS_API, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -103,7 +104,7 @@ const EventsManager = () => {
 
   const handleUpdateStatus = async (id: number, newStatus: string) => {
     try {
-      const response = await fetch(EVENTS_API, {
+      const response = await apiFetch(EVENTS_API, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -134,7 +135,7 @@ const EventsManager = () => {
     if (!confirm('Удалить мероприятие?')) return;
 
     try {
-      const response = await fetch(`${EVENTS_API}?id=${id}`, {
+      const response = await apiFetch(`${EVENTS_API}?id=${id}`, {
         method: 'DELETE',
       });
 
@@ -7,6 +7,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Label } from '@/components/ui/label';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { apiFetch } from '@/lib/api';
 
 const REPORTS_API = 'https://functions.poehali.dev/ebb81c72-3e10-4e18-a859-4257bfd0c0cc';
 
@@ -49,7 +50,7 @@ const ReportsPage = () => {
   const handleGenerateReport = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${REPORTS_API}?type=${reportType}`);
+      const response = await apiFetch(`${REPORTS_API}?type=${reportType}`);
       if (!response.ok) throw new Error('Failed to generate report');
 
       const data = await response.json();
@@ -73,7 +74,7 @@ const ReportsPage = () => {
   const handleExportReport = async () => {
     setLoading(true);
     try {
-      const response = await fetch(REPORTS_API, {
+      const response = await apiFetch(REPORTS_API, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({